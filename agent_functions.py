@@ -1,33 +1,35 @@
 import asyncio
 from datetime import datetime
-import pytz
-import json
-import os
 import re
+from call_store import new_call_id, store
+from contact_normalizer import normalize_email, normalize_phone
+from office_schedule import schedule_for
+from patient_index import patients
+from relay_log import log
+from write_behind import writer
 
 # ------------------------------------------------------------------
-# Office hours configuration
+# Office hours (office_schedule.py precomputes the open/close instants)
 # ------------------------------------------------------------------
-OFFICE_HOURS = {
-    "Monday": (8, 16),
-    "Tuesday": (8, 17),
-    "Wednesday": (8, 19),
-    "Thursday": (8, 17),
-    "Friday": (8, 15),
-    "Saturday": (8, 14),
-    "Sunday": None,
-}
+_status_label = [None, None]  # [minute, (within_hours, "Monday 09:30 AM")]
+
 
 def get_office_status():
-    tz = pytz.timezone("America/New_York")
-    now = datetime.now(tz)
-    day = now.strftime("%A")
-    hours = OFFICE_HOURS.get(day)
-    if not hours:
-        return False, f"{day} {now.strftime('%I:%M %p')}"
-    start, end = hours
-    within_hours = start <= now.hour < end
-    return within_hours, f"{day} {now.strftime('%I:%M %p')}"
+    schedule = schedule_for()
+    t = schedule.clock()
+    within_hours, _ = schedule.status(t)
+    minute = int(t // 60)
+    cached = _status_label[1]
+    if _status_label[0] == minute and cached[0] == within_hours:
+        return cached
+    now = datetime.fromtimestamp(t, schedule.tz)
+    _status_label[:] = [minute, (within_hours, now.strftime("%A %I:%M %p"))]
+    return _status_label[1]
+
+
+def next_opening_label():
+    opening = schedule_for().next_opening()
+    return opening.strftime("%A %I:%M %p") if opening else None
 
 # ------------------------------------------------------------------
 # Helper validation functions
@@ -38,17 +40,21 @@ def validate_email(email: str) -> bool:
 def validate_phone(phone: str) -> bool:
     return bool(re.match(r"^\+?1?\d{10,15}$", phone))
 
+# Below this the agent should read the value back and confirm it.
+CONTACT_MIN_CONFIDENCE = 0.6
+
 # ------------------------------------------------------------------
-# JSON persistence
+# Persistence: write-behind into the indexed call store (call_store.py)
 # ------------------------------------------------------------------
+writer.register("calls", store.sink("contact"))
+
+
 def save_call_data(data: dict):
-    os.makedirs("data/calls", exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"data/calls/{timestamp}.json"
-    with open(filename, "w") as f:
-        json.dump(data, f, indent=2)
-    print(f"✅ Saved call data → {filename}")
-    return {"status": "saved", "file": filename}
+    record = {"id": new_call_id(), "savedAt": datetime.now().isoformat(), **data}
+    writer.submit("calls", record)
+    log.info("✅ Queued call data → %s (%s)", store.path, record["id"])
+    # Written behind: the record is not on disk yet when the agent hears back.
+    return {"status": "queued", "id": record["id"]}
 
 # ------------------------------------------------------------------
 # Async functions exposed to Deepgram's think() layer
@@ -57,15 +63,23 @@ def save_call_data(data: dict):
 async def check_office_hours(params):
     """Return whether the office is open right now."""
     within_hours, current_time = get_office_status()
-    return {"is_open": within_hours, "time": current_time}
+    result = {"is_open": within_hours, "time": current_time}
+    if not within_hours:
+        result["next_open"] = next_opening_label()
+    return result
 
 async def validate_contact(params):
-    """Validate email and phone and return flags."""
-    email = params.get("email")
-    phone = params.get("phone")
-    valid_email = validate_email(email) if email else False
-    valid_phone = validate_phone(phone) if phone else False
-    return {"valid_email": valid_email, "valid_phone": valid_phone}
+    """Normalize spoken email and phone ("john at gmail dot com") and return flags plus canonical forms."""
+    email = normalize_email(params.get("email"))
+    phone = normalize_phone(params.get("phone"))
+    return {
+        "valid_email": email.confidence >= CONTACT_MIN_CONFIDENCE,
+        "valid_phone": phone.confidence >= CONTACT_MIN_CONFIDENCE,
+        "email": email.value,
+        "phone": phone.value,
+        "email_confidence": email.confidence,
+        "phone_confidence": phone.confidence,
+    }
 
 async def capture_contact(params):
     """Capture caller contact info and save as JSON"""
@@ -96,9 +110,26 @@ async def capture_contact(params):
         "servicesInterested": None,
         "message": reason,
         "source": ["voice-agent"],
+        "savedAt": datetime.now().isoformat(),  # the stored record and the index share it
     }
 
-    return save_call_data(record)
+    result = save_call_data(record)
+    patients.add({**record, "id": result["id"]})
+    return result
+
+
+async def lookup_patient(params):
+    """
+    Look up a caller in the in-memory patient index by phone, email or name.
+    Name-only matches carry no contact details (see PatientIndex).
+    """
+    await patients.refresh(store)
+    matches = patients.lookup(
+        phone=params.get("phone"),
+        email=params.get("email"),
+        name=params.get("name"),
+    )
+    return {"found": bool(matches), "matches": matches}
 
 
 async def end_call(params):
@@ -122,12 +153,12 @@ FUNCTION_DEFINITIONS = [
     },
     {
         "name": "validate_contact",
-        "description": "Validate provided email and phone number formats.",
+        "description": "Validate an email and phone number as the caller said them; returns canonical forms to read back.",
         "parameters": {
             "type": "object",
             "properties": {
-                "email": {"type": "string"},
-                "phone": {"type": "string"},
+                "email": {"type": "string", "description": "Email exactly as spoken, e.g. 'john at gmail dot com'"},
+                "phone": {"type": "string", "description": "Phone number exactly as spoken, words or digits"},
             },
             "required": []
         },
@@ -143,13 +174,31 @@ FUNCTION_DEFINITIONS = [
                     "description": "Whether the caller is a new or existing patient.",
                     "enum": ["new", "existing", "other"]
                 },
-                "firstName": {"type": "string"},
-                "lastName": {"type": "string"},
+                "fullName": {
+                    "type": "string",
+                    "description": "The caller's full name"
+                },
                 "email": {"type": "string"},
                 "phoneNumber": {"type": "string"},
                 "reason": {"type": "string"},
             },
-            "required": ["phoneNumber"],
+            "required": ["fullName", "phoneNumber"],
+        },
+    },
+    {
+        "name": "lookup_patient",
+        "description": "Check whether a caller is already on file, by phone number, email or name.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "phone": {"type": "string"},
+                "email": {"type": "string"},
+                "name": {
+                    "type": "string",
+                    "description": "Full name or the beginning of it"
+                },
+            },
+            "required": []
         },
     },
     {
@@ -163,8 +212,8 @@ FUNCTION_DEFINITIONS = [
                     "enum": ["thanks", "general", "bye"],
                 }
             },
+            "required": []
         },
-        "required": []
     },
 ]
 
@@ -172,5 +221,6 @@ FUNCTION_MAP = {
     "check_office_hours": check_office_hours,
     "validate_contact": validate_contact,
     "capture_contact": capture_contact,
+    "lookup_patient": lookup_patient,
     "end_call": end_call,
 }
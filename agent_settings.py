@@ -0,0 +1,174 @@
+import json
+from datetime import datetime
+
+import pytz
+
+import agent_functions
+import prompt
+from agent_functions import get_office_status
+
+# ------------------------------------------------------------------
+# Deepgram agent Settings, pre-serialized once and spliced per call
+# ------------------------------------------------------------------
+GREETING = "Hi there! Thanks for calling Brookline Progressive Dental. How can I help you today?"
+
+# Sentinels rendered into the prompt in place of the per-call fields. They
+# survive json.dumps unchanged, so they can be found in the serialized text.
+DATE_SLOT = "@@CURRENT_DATE@@"
+STATUS_SLOT = "@@OFFICE_STATUS@@"
+TIME_SLOT = "@@CURRENT_TIME@@"
+SLOTS = (DATE_SLOT, STATUS_SLOT, TIME_SLOT)
+
+
+def build_config(system_prompt: str, functions=None) -> dict:
+    """The Settings message sent to Deepgram at the start of a call."""
+    think = {
+        "provider": {"type": "open_ai", "model": "gpt-4o", "temperature": 0.7},
+        "prompt": system_prompt,
+    }
+    if functions:
+        think["functions"] = functions
+
+    return {
+        "type": "Settings",
+        "audio": {
+            "input": {"encoding": "mulaw", "sample_rate": 8000},
+            "output": {"encoding": "mulaw", "sample_rate": 8000, "container": "none"},
+        },
+        "agent": {
+            "language": "en",
+            "listen": {"provider": {"type": "deepgram", "model": "nova-3"}},
+            "think": think,
+            "speak": {"provider": {"type": "deepgram", "model": "aura-2-thalia-en"}},
+            "greeting": GREETING,
+        },
+    }
+
+
+class SettingsCache:
+    """
+    Renders the Settings payload from a template serialized once.
+
+    The prompt builder is called with sentinel values and the whole config is
+    dumped to JSON; the text is then split at the sentinels. Rendering for a
+    call only JSON-escapes the date/time and OPEN/CLOSED strings and joins.
+    The finished payload is reused until the minute or office status changes,
+    and the template is rebuilt when the prompt builder's code or the
+    serialized function definitions change (or on invalidate()). By default
+    both are looked up on the prompt and agent_functions modules at every
+    render, so rebinding or reloading them is picked up.
+    """
+
+    def __init__(self, prompt_builder=None, functions=None, timezone="America/New_York"):
+        self.prompt_builder = prompt_builder
+        self.functions = functions
+        self.tz = pytz.timezone(timezone)
+        self._parts = None
+        self._order = None
+        self._template_key = None
+        self._payload = None
+        self._payload_key = None
+
+        self.template_builds = 0
+        self.renders = 0
+        self.hits = 0
+
+    def invalidate(self):
+        self._parts = None
+        self._payload = None
+
+    def version(self):
+        """Changes when the office opens or closes or the day rolls over."""
+        within_hours, _ = get_office_status()
+        return datetime.now(self.tz).date(), within_hours
+
+    def render(self) -> str:
+        """Return the serialized Settings message for a call starting now."""
+        now = datetime.now(self.tz)
+        current_date = now.strftime("%A, %B %d, %Y %I:%M %p")
+        within_hours, current_time = get_office_status()
+        office_status = "OPEN" if within_hours else "CLOSED"
+
+        builder, functions = self._sources()
+        template_key = self._current_template_key(builder, functions)
+        if self._parts is None or template_key != self._template_key:
+            self._build_template(template_key, builder, functions)
+
+        payload_key = (current_date, office_status, current_time)
+        if self._payload is not None and payload_key == self._payload_key:
+            self.hits += 1
+            return self._payload
+
+        values = {DATE_SLOT: current_date, STATUS_SLOT: office_status, TIME_SLOT: current_time}
+        pieces = [self._parts[0]]
+        for slot, part in zip(self._order, self._parts[1:]):
+            pieces.append(json.dumps(values[slot])[1:-1])
+            pieces.append(part)
+        self._payload = "".join(pieces)
+        self._payload_key = payload_key
+        self.renders += 1
+        return self._payload
+
+    # --- internals ---
+    def _sources(self):
+        builder = self.prompt_builder or prompt.build_phone_prompt
+        functions = agent_functions.FUNCTION_DEFINITIONS if self.functions is None else self.functions
+        return builder, functions
+
+    @staticmethod
+    def _current_template_key(builder, functions):
+        # Serializing catches definitions edited in place, not just replaced.
+        return getattr(builder, "__code__", builder), json.dumps(functions)
+
+    def _build_template(self, template_key, builder, functions):
+        system_prompt = builder(DATE_SLOT, STATUS_SLOT, TIME_SLOT)
+        serialized = json.dumps(build_config(system_prompt, functions))
+
+        parts, order = [], []
+        pos = 0
+        while True:
+            hits = [(serialized.find(slot, pos), slot) for slot in SLOTS]
+            hits = [(i, slot) for i, slot in hits if i >= 0]
+            if not hits:
+                break
+            i, slot = min(hits)
+            parts.append(serialized[pos:i])
+            order.append(slot)
+            pos = i + len(slot)
+        parts.append(serialized[pos:])
+
+        self._parts = parts
+        self._order = order
+        self._template_key = template_key
+        self._payload = None
+        self.template_builds += 1
+
+
+if __name__ == "__main__":
+    import timeit
+
+    cache = SettingsCache()
+
+    def uncached():
+        now = datetime.now(pytz.timezone("America/New_York"))
+        current_date = now.strftime("%A, %B %d, %Y %I:%M %p")
+        within_hours, current_time = get_office_status()
+        office_status = "OPEN" if within_hours else "CLOSED"
+        system_prompt = prompt.build_phone_prompt(current_date, office_status, current_time)
+        return json.dumps(build_config(system_prompt, agent_functions.FUNCTION_DEFINITIONS))
+
+    assert json.loads(uncached()) == json.loads(cache.render())
+
+    # Edits are picked up: a definition changed in place, a rebound builder.
+    agent_functions.FUNCTION_DEFINITIONS[0]["description"] += " (edited)"
+    assert "(edited)" in cache.render()
+    original = prompt.build_phone_prompt
+    prompt.build_phone_prompt = lambda *args: "REPLACED " + original(*args)
+    assert "REPLACED" in cache.render()
+    prompt.build_phone_prompt = original
+    agent_functions.FUNCTION_DEFINITIONS[0]["description"] = agent_functions.FUNCTION_DEFINITIONS[0]["description"][:-9]
+    assert json.loads(uncached()) == json.loads(cache.render())
+    print(f"✅ template rebuilt on edits ({cache.template_builds} builds)")
+    for name, fn in (("uncached", uncached), ("SettingsCache", cache.render)):
+        per_call = timeit.timeit(fn, number=2000) / 2000 * 1e6
+        print(f"{name:14s} {per_call:8.1f} µs per call")
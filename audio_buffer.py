@@ -0,0 +1,188 @@
+import binascii
+import time
+
+MULAW_BYTES_PER_MS = 8  # 8 kHz, one byte per sample
+TWILIO_FRAME_MS = 20
+
+# ------------------------------------------------------------------
+# Inbound audio ring buffer
+# ------------------------------------------------------------------
+NO_FRAMES = ()
+
+
+class AudioRingBuffer:
+    """
+    Fixed-capacity, per-call ring of frame slots for inbound mulaw.
+
+    Decoded payloads are copied straight into preallocated storage and full
+    frames are handed out as memoryview slices of that storage, so flushing
+    never copies the remaining buffer or allocates a new chunk. A returned
+    frame stays valid until the ring wraps, i.e. for `slots - 1` more frames;
+    consumers must send it before then.
+    """
+
+    def __init__(self, frame_size=20 * 160, slots=64):
+        self.frame_size = frame_size
+        self.slots = slots
+        self._storage = bytearray(frame_size * slots)
+        self._view = memoryview(self._storage)
+        self._slot = 0
+        self._fill = 0
+
+    def __len__(self):
+        """Bytes waiting in the frame currently being filled."""
+        return self._fill
+
+    def write(self, data):
+        """Copy `data` into the ring and return the frames it completes."""
+        n = len(data)
+        fill = self._fill
+        if fill + n < self.frame_size:
+            # Common case: a 20 ms payload that does not finish a frame.
+            start = self._slot * self.frame_size + fill
+            self._storage[start:start + n] = data
+            self._fill = fill + n
+            return NO_FRAMES
+
+        frames = []
+        src = memoryview(data)
+        while src:
+            start = self._slot * self.frame_size + self._fill
+            n = min(self.frame_size - self._fill, len(src))
+            self._view[start:start + n] = src[:n]
+            self._fill += n
+            src = src[n:]
+            if self._fill == self.frame_size:
+                frames.append(self._take())
+        return frames
+
+    def write_b64(self, payload):
+        """Decode a base64 media payload into the ring; returns completed frames."""
+        # The stdlib cannot decode into an existing buffer, so the decoded
+        # bytes are copied exactly once, into their slot.
+        return self.write(binascii.a2b_base64(payload))
+
+    def flush(self):
+        """Return the partially filled frame (or None) and start a new slot."""
+        if not self._fill:
+            return None
+        return self._take()
+
+    def _take(self):
+        start = self._slot * self.frame_size
+        frame = self._view[start:start + self._fill]
+        self._slot = (self._slot + 1) % self.slots
+        self._fill = 0
+        return frame
+
+
+# ------------------------------------------------------------------
+# Inbound framing with a flush deadline
+# ------------------------------------------------------------------
+class InboundFramer:
+    """
+    Batches inbound Twilio audio into `frame_ms` frames for the STS sender.
+
+    A frame is flushed when it is full, or early once its oldest byte has
+    waited `max_delay_ms`, so a short frame duration bounds the latency added
+    to endpointing and barge-in while longer frames cut the websocket message
+    rate. The deadline is checked on every inbound message, which Twilio sends
+    every 20 ms.
+    """
+
+    def __init__(self, frame_ms=100, max_delay_ms=None, buffered_ms=10_000, clock=time.monotonic):
+        frame_ms = max(TWILIO_FRAME_MS, frame_ms)
+        self.frame_ms = frame_ms
+        self.max_delay = (max_delay_ms if max_delay_ms is not None else frame_ms) / 1000
+        self.clock = clock
+        self.ring = AudioRingBuffer(frame_ms * MULAW_BYTES_PER_MS, slots=max(8, buffered_ms // frame_ms))
+        self._first_at = None
+
+        self.frames = 0
+        self.deadline_flushes = 0
+        self.total_delay = 0.0
+        self.max_delay_seen = 0.0
+
+    def push_b64(self, payload):
+        """Add one base64 media payload; returns the frames ready to send."""
+        return self.push(binascii.a2b_base64(payload))
+
+    def push(self, data):
+        """Add already-decoded mulaw (e.g. when it was also fed to the VAD)."""
+        now = self.clock()
+        if self._first_at is None:
+            self._first_at = now
+
+        frames = self.ring.write(data)
+        if frames:
+            self._record(now, len(frames))
+            self._first_at = now if len(self.ring) else None
+        elif now - self._first_at >= self.max_delay:
+            frames = (self.ring.flush(),)
+            self.deadline_flushes += 1
+            self._record(now, 1)
+            self._first_at = None
+        return frames
+
+    def flush(self):
+        """Return whatever is buffered (or None), e.g. at the Twilio stop event."""
+        frame = self.ring.flush()
+        if frame is not None:
+            self._record(self.clock(), 1)
+            self._first_at = None
+        return frame
+
+    def _record(self, now, count):
+        # Only the first frame of a batch waited; the rest completed with it.
+        delay = now - self._first_at
+        self.frames += count
+        self.total_delay += delay
+        self.max_delay_seen = max(self.max_delay_seen, delay)
+
+    def stats(self):
+        return {
+            "frame_ms": self.frame_ms,
+            "frames": self.frames,
+            "deadline_flushes": self.deadline_flushes,
+            "avg_buffer_delay_ms": round(self.total_delay / self.frames * 1000, 1) if self.frames else 0.0,
+            "max_buffer_delay_ms": round(self.max_delay_seen * 1000, 1),
+        }
+
+
+if __name__ == "__main__":
+    # Microbenchmark: bytearray slicing (old twilio_receiver path) vs ring.
+    import base64
+    import os
+    import timeit
+    import tracemalloc
+
+    BUFFER_SIZE = 20 * 160
+    payloads = [base64.b64encode(os.urandom(160)).decode("ascii") for _ in range(1000)]
+
+    def bytearray_path():
+        inbuffer = bytearray(b"")
+        out = []
+        for payload in payloads:
+            inbuffer.extend(base64.b64decode(payload))
+            while len(inbuffer) >= BUFFER_SIZE:
+                out.append(inbuffer[:BUFFER_SIZE])
+                inbuffer = inbuffer[BUFFER_SIZE:]
+        return out
+
+    ring = AudioRingBuffer(BUFFER_SIZE)
+
+    def ring_path():
+        out = []
+        for payload in payloads:
+            out.extend(ring.write_b64(payload))
+        return out
+
+    runs = 200
+    for name, fn in (("bytearray", bytearray_path), ("ring", ring_path)):
+        seconds = timeit.timeit(fn, number=runs)
+        per_msg = seconds / (runs * len(payloads)) * 1e9
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:10s} {per_msg:8.1f} ns/message  peak {peak / 1024:7.1f} KiB per 1000 messages")
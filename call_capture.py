@@ -0,0 +1,341 @@
+import binascii
+import bisect
+import json
+import os
+import struct
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from metrics import Histogram
+from relay_log import log
+from twilio_codec import decode_twilio
+
+# ------------------------------------------------------------------
+# Wire-level capture of both sockets of a call
+# ------------------------------------------------------------------
+# CALL_CAPTURE_DIR=captures makes twilio_handler record every message on
+# both sockets with monotonic timestamps (python call_capture.py replay
+# FILE replays one against the relay).
+CALL_CAPTURE_DIR = os.getenv("CALL_CAPTURE_DIR", "")
+
+MAGIC = b"VACAP\x01"
+HEADER = struct.Struct("<d")  # wall-clock start, for humans
+RECORD = struct.Struct("<dBI")  # seconds since start, kind, payload length
+
+# Record kinds. Audio is stored raw (mulaw), never base64.
+TWILIO_IN_TEXT, TWILIO_IN_AUDIO = 0, 1
+TWILIO_OUT_TEXT, TWILIO_OUT_AUDIO = 2, 3
+AGENT_IN_TEXT, AGENT_IN_AUDIO = 4, 5
+AGENT_OUT_TEXT, AGENT_OUT_AUDIO = 6, 7
+
+FLUSH_BYTES = 256 * 1024
+
+# One thread does every capture write, so a call's chunks stay in order
+# and the event loop never touches the file.
+_io = ThreadPoolExecutor(1, thread_name_prefix="call-capture")
+
+
+class CallCapture:
+    """
+    Appends a call's messages to DIR/<stamp>_<id>.cap as fixed-size record
+    headers plus payloads. Records accumulate in memory and are handed to
+    the capture thread every FLUSH_BYTES and at close().
+    """
+
+    def __init__(self, directory=CALL_CAPTURE_DIR, clock=time.monotonic, log=log):
+        self.clock = clock
+        self.log = log
+        self.started_at = clock()
+        name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.cap"
+        self.path = os.path.join(directory, name)
+        self._buffer = bytearray(MAGIC + HEADER.pack(time.time()))
+        self._file = _io.submit(self._open, directory)
+        self.records = 0
+        self.error = None  # first failure on the capture thread, logged once
+
+    def wrap(self, twilio_ws, sts_ws):
+        """Return recording proxies for (twilio_ws, sts_ws)."""
+        return (
+            _CapturedSocket(twilio_ws, self, self._twilio_in, self._twilio_out),
+            _CapturedSocket(sts_ws, self, self._agent_in, self._agent_out),
+        )
+
+    def record(self, kind, payload):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        self._buffer += RECORD.pack(self.clock() - self.started_at, kind, len(payload))
+        self._buffer += payload
+        self.records += 1
+        if len(self._buffer) >= FLUSH_BYTES:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        _io.submit(self._close)
+        self.log.info("🎞️ Captured %d messages → %s", self.records, self.path)
+
+    # --- classification of each direction ---
+    def _twilio_in(self, message):
+        event, data = decode_twilio(message)
+        if event == "media" and data is not None:
+            self.record(TWILIO_IN_AUDIO, binascii.a2b_base64(data))
+        else:
+            self.record(TWILIO_IN_TEXT, message)
+
+    def _twilio_out(self, message):
+        if message.startswith('{"event":"media"'):
+            self.record(TWILIO_OUT_AUDIO, binascii.a2b_base64(json.loads(message)["media"]["payload"]))
+        else:
+            self.record(TWILIO_OUT_TEXT, message)
+
+    def _agent_in(self, message):
+        self.record(AGENT_IN_TEXT if isinstance(message, str) else AGENT_IN_AUDIO, message)
+
+    def _agent_out(self, message):
+        self.record(AGENT_OUT_TEXT if isinstance(message, str) else AGENT_OUT_AUDIO, message)
+
+    # --- capture thread ---
+    def _flush(self):
+        if self._buffer:
+            chunk, self._buffer = bytes(self._buffer), bytearray()
+            _io.submit(self._write, chunk)
+
+    def _open(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        return open(self.path, "wb")
+
+    def _write(self, chunk):
+        try:
+            self._file.result().write(chunk)
+        except Exception as e:
+            self._failed(e)
+
+    def _close(self):
+        try:
+            self._file.result().close()
+        except Exception as e:
+            self._failed(e)
+
+    def _failed(self, e):
+        if self.error is None:
+            self.error = e
+            self.log.error("❌ Capture %s failed: %s", self.path, e)
+
+
+class _CapturedSocket:
+    """Passes everything through to `ws`, recording messages in both directions."""
+
+    def __init__(self, ws, capture, on_receive, on_send):
+        self._ws = ws
+        self._capture = capture
+        self._on_receive = on_receive
+        self._on_send = on_send
+
+    def __getattr__(self, name):
+        return getattr(self._ws, name)
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        async for message in self._ws:
+            self._on_receive(message)
+            yield message
+
+    async def send(self, message):
+        self._on_send(message)
+        await self._ws.send(message)
+
+    async def close(self):
+        await self._ws.close()
+
+
+# ------------------------------------------------------------------
+# Reading and analysing captures
+# ------------------------------------------------------------------
+def read_capture(path):
+    """Yield (seconds, kind, payload) records from a capture file."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a call capture")
+    pos = len(MAGIC) + HEADER.size
+    while pos + RECORD.size <= len(data):
+        t, kind, n = RECORD.unpack_from(data, pos)
+        pos += RECORD.size
+        yield t, kind, data[pos:pos + n]
+        pos += n
+
+
+def _byte_delays(sources, sinks, histogram):
+    """
+    For each sink chunk, the time since the source chunk holding its last
+    byte arrived. A sink entry with size None (a Twilio clear) drops what was
+    still unsent, re-aligning the byte counts.
+    """
+    ends, times, total = [], [], 0
+    for t, size in sources:
+        total += size
+        ends.append(total)
+        times.append(t)
+    sent = 0
+    for t, size in sinks:
+        if size is None:
+            i = bisect.bisect_right(times, t)
+            sent = ends[i - 1] if i else 0
+            continue
+        sent += size
+        i = bisect.bisect_left(ends, sent)
+        if i < len(ends):
+            histogram.observe(max(0.0, t - times[i]))
+
+
+def analyze(path):
+    """Relay-side latencies recorded in a capture."""
+    inbound, forwarded, agent_audio, played = [], [], [], []
+    function_requests, function_latency = [], Histogram()
+    settings_at = first_audio_at = None
+    for t, kind, payload in read_capture(path):
+        if kind == TWILIO_IN_AUDIO:
+            inbound.append((t, len(payload)))
+        elif kind == AGENT_OUT_AUDIO:
+            forwarded.append((t, len(payload)))
+        elif kind == AGENT_IN_AUDIO:
+            agent_audio.append((t, len(payload)))
+        elif kind == TWILIO_OUT_AUDIO:
+            played.append((t, len(payload)))
+            if first_audio_at is None:
+                first_audio_at = t
+        elif kind == TWILIO_OUT_TEXT and b'"clear"' in payload:
+            played.append((t, None))
+        elif kind == AGENT_IN_TEXT and b'"FunctionCall' in payload:
+            function_requests.append(t)
+        elif kind == AGENT_OUT_TEXT:
+            if b'"FunctionCallResponse"' in payload and function_requests:
+                function_latency.observe(t - function_requests.pop(0))
+            elif b'"Settings"' in payload and settings_at is None:
+                settings_at = t
+
+    inbound_latency, outbound_latency = Histogram(), Histogram()
+    _byte_delays(inbound, forwarded, inbound_latency)
+    _byte_delays(agent_audio, played, outbound_latency)
+    first_audio = None
+    if first_audio_at is not None:
+        first_audio = round((first_audio_at - (settings_at or 0.0)) * 1000, 1)
+    return {
+        "inbound_relay": inbound_latency.summary(),
+        "outbound_relay": outbound_latency.summary(),
+        "function_roundtrip": function_latency.summary(),
+        "first_audio_ms": first_audio,
+    }
+
+
+# ------------------------------------------------------------------
+# Replay: the recorded Twilio side and agent side against a live relay
+# ------------------------------------------------------------------
+async def replay(path, speed=1.0, port=5092, agent_port=5093):
+    """Drive a fresh relay with a capture; returns the relay's own capture of the replay."""
+    import argparse
+    import asyncio
+    import base64
+    import glob
+    import signal
+    import subprocess
+    import tempfile
+
+    import websockets
+
+    from loadtest import start_relay, wait_for_port
+
+    records = list(read_capture(path))
+    agent_script = [(t, kind, p) for t, kind, p in records if kind in (AGENT_IN_TEXT, AGENT_IN_AUDIO)]
+    twilio_script = [(t, kind, p) for t, kind, p in records if kind in (TWILIO_IN_TEXT, TWILIO_IN_AUDIO)]
+    settings_at = next((t for t, kind, p in records if kind == AGENT_OUT_TEXT and b'"Settings"' in p), 0.0)
+
+    async def play(ws, script, origin, send):
+        started = time.monotonic()
+        for t, kind, payload in script:
+            delay = (t - origin) / speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await send(ws, kind, payload)
+
+    async def send_agent(ws, kind, payload):
+        await ws.send(payload.decode("utf-8") if kind == AGENT_IN_TEXT else payload)
+
+    async def send_twilio(ws, kind, payload):
+        if kind == TWILIO_IN_AUDIO:
+            payload = json.dumps({"event": "media", "media": {
+                "track": "inbound", "payload": base64.b64encode(payload).decode("ascii"),
+            }}, separators=(",", ":"))
+        else:
+            payload = payload.decode("utf-8")
+        await ws.send(payload)
+
+    async def agent(ws):
+        # Pooled sockets sit idle until the relay sends Settings for a call.
+        try:
+            async for message in ws:
+                if isinstance(message, str) and '"Settings"' in message:
+                    break
+            else:
+                return
+            player = asyncio.create_task(play(ws, agent_script, settings_at, send_agent))
+            async for _ in ws:
+                pass
+            player.cancel()
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    workdir = tempfile.mkdtemp(prefix="relay-replay-")
+    os.environ["CALL_CAPTURE_DIR"] = os.path.join(workdir, "captures")
+    # A preconfigured pool would send Settings before the call and start the
+    # stand-in agent's script early.
+    os.environ["STS_POOL_PRECONFIGURE"] = "0"
+    relay = start_relay(argparse.Namespace(workers=0, port=port, agent_port=agent_port), workdir)
+    try:
+        async with websockets.serve(agent, "127.0.0.1", agent_port, max_queue=None):
+            await wait_for_port(port)
+            async with websockets.connect(f"ws://127.0.0.1:{port}/twilio", max_queue=None) as ws:
+                await play(ws, twilio_script, 0.0, send_twilio)
+                await asyncio.sleep(0.5)
+            for _ in range(50):  # teardown flushes the relay's capture
+                captures = glob.glob(os.path.join(workdir, "captures", "*.cap"))
+                if captures:
+                    return captures[0]
+                await asyncio.sleep(0.1)
+            raise RuntimeError("relay wrote no capture for the replay")
+    finally:
+        relay.send_signal(signal.SIGTERM)
+        try:
+            relay.wait(10)
+        except subprocess.TimeoutExpired:
+            relay.kill()
+            relay.wait()
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Inspect or replay wire-level call captures")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show = sub.add_parser("analyze", help="relay latencies recorded in a capture")
+    show.add_argument("capture")
+    again = sub.add_parser("replay", help="replay a capture against a local relay and diff latencies")
+    again.add_argument("capture")
+    again.add_argument("--speed", type=float, default=1.0, help="1 = real time, 4 = four times faster")
+    args = parser.parse_args()
+
+    original = analyze(args.capture)
+    if args.command == "analyze":
+        print(json.dumps(original, indent=2))
+    else:
+        replayed = analyze(asyncio.run(replay(args.capture, args.speed)))
+        print(f"{'metric':22s} {'original':>20s} {'replay':>20s}")
+        for name in ("inbound_relay", "outbound_relay", "function_roundtrip"):
+            for stat in ("p50_ms", "p95_ms"):
+                print(f"{name + ' ' + stat[:3]:22s} {original[name][stat]!s:>20s} {replayed[name][stat]!s:>20s}")
+        print(f"{'first_audio_ms':22s} {original['first_audio_ms']!s:>20s} {replayed['first_audio_ms']!s:>20s}")
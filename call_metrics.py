@@ -0,0 +1,105 @@
+import time
+
+from metrics import Histogram, turn_latency
+
+# ------------------------------------------------------------------
+# Per-call, per-turn latency tracking from Deepgram and Twilio events
+# ------------------------------------------------------------------
+class CallMetrics:
+    """
+    Timestamps one call's turn events and turns them into latencies:
+
+    - greeting_first_audio:  call start → first agent audio byte
+    - time_to_first_audio:   end of the caller's utterance (their final
+                             ConversationText) → first agent audio byte after it
+    - user_turn:             UserStartedSpeaking → end of their utterance
+    - function_roundtrip:    FunctionCallRequest → response sent
+    - agent_reported_*:      latencies Deepgram reports in AgentStartedSpeaking
+    - agent_speaking:        first audio byte → AgentAudioDone
+
+    Every value goes into the process-wide metrics.turn_latency registry
+    and into this call's own histograms, which summary() reports.
+    """
+
+    def __init__(self, call_id, clock=time.monotonic):
+        self.call_id = call_id
+        self.clock = clock
+        self.started_at = clock()
+        self.histograms = {}
+        self.turns = []
+
+        self._user_started = None
+        self._user_ended = None
+        self._first_audio = None  # first agent byte of the current response
+        self._greeted = False
+        self._functions = []  # calls made while preparing the next response
+
+    def observe(self, name, seconds):
+        turn_latency[name].observe(seconds)
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms[name] = Histogram()
+        hist.observe(seconds)
+
+    # --- Deepgram events ---
+    def user_started_speaking(self):
+        self._user_started = self.clock()
+
+    def user_text(self):
+        """The caller's final ConversationText: their utterance has ended."""
+        now = self.clock()
+        if self._user_started is not None:
+            self.observe("user_turn", now - self._user_started)
+            self._user_started = None
+        self._user_ended = now
+        self._first_audio = None
+
+    def agent_audio(self):
+        """Called for every binary audio message; only the first of a response counts."""
+        if self._first_audio is not None:
+            return
+        now = self.clock()
+        self._first_audio = now
+        if not self._greeted:
+            self._greeted = True
+            self.observe("greeting_first_audio", now - self.started_at)
+        elif self._user_ended is not None:
+            ttfa = now - self._user_ended
+            self.observe("time_to_first_audio", ttfa)
+            turn = {"turn": len(self.turns) + 1, "time_to_first_audio_ms": round(ttfa * 1000, 1)}
+            if self._functions:
+                turn["functions"], self._functions = self._functions, []
+            self.turns.append(turn)
+            self._user_ended = None
+
+    def agent_started_speaking(self, decoded):
+        for key in ("total_latency", "tts_latency", "ttt_latency"):
+            value = decoded.get(key)
+            if isinstance(value, (int, float)):
+                self.observe(f"agent_reported_{key}", value)
+
+    def agent_audio_done(self):
+        if self._first_audio is not None:
+            self.observe("agent_speaking", self.clock() - self._first_audio)
+        # The next audio belongs to a new response (e.g. after a function call).
+        self._first_audio = None
+
+    def function_response(self, fn_name, seconds):
+        self.observe("function_roundtrip", seconds)
+        self._functions.append({"name": fn_name, "ms": round(seconds * 1000, 1)})
+
+    # --- queues and framing ---
+    def include(self, name, histogram):
+        """Adopt a component's own delay histogram (e.g. the audio queue's) at call end."""
+        if histogram.count:
+            self.histograms[name] = histogram
+            turn_latency[name].merge(histogram)
+
+    def summary(self, **extra):
+        return {
+            "callId": self.call_id,
+            "duration_s": round(self.clock() - self.started_at, 1),
+            "turns": self.turns,
+            "latency": {name: hist.summary() for name, hist in sorted(self.histograms.items())},
+            **extra,
+        }
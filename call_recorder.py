@@ -0,0 +1,262 @@
+import os
+import struct
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from audio_codec import MULAW_TO_PCM
+from metrics import Histogram
+from relay_log import log
+
+# ------------------------------------------------------------------
+# Dual-track call recording (caller left, agent right) to WAV
+# ------------------------------------------------------------------
+# RECORDING_DIR=recordings turns recording on. RECORDING_FORMAT is pcm
+# (16-bit, plays everywhere) or mulaw (8-bit G.711 WAV, half the size).
+RECORDING_DIR = os.getenv("RECORDING_DIR", "")
+RECORDING_FORMAT = os.getenv("RECORDING_FORMAT", "pcm")
+RECORDING_PREALLOC_S = int(os.getenv("RECORDING_PREALLOC_S", "600"))
+RECORDING_MAX_BUFFER_MS = int(os.getenv("RECORDING_MAX_BUFFER_MS", "10000"))
+
+RATE = 8000
+SAMPLES_PER_MS = 8
+SILENCE = b"\xff"  # mulaw zero
+FLUSH_INTERVAL = 1.0
+# Agent audio is placed up to this far ahead of now; a clear can still
+# erase it, so it stays in memory until it has played.
+OUTBOUND_LEAD = 0.5
+
+# Every recording is written by this one thread.
+_io = ThreadPoolExecutor(1, thread_name_prefix="call-recorder")
+
+
+def wav_header(fmt, frames):
+    """RIFF header for 8 kHz stereo; `frames` is the number of sample pairs."""
+    if fmt == "mulaw":
+        width, tag = 1, 7
+        fmt_chunk = struct.pack("<4sIHHIIHHH", b"fmt ", 18, tag, 2, RATE, RATE * 2 * width, 2 * width, 8 * width, 0)
+        fmt_chunk += struct.pack("<4sII", b"fact", 4, frames)
+    else:
+        width, tag = 2, 1
+        fmt_chunk = struct.pack("<4sIHHIIHH", b"fmt ", 16, tag, 2, RATE, RATE * 2 * width, 2 * width, 8 * width)
+    data_bytes = frames * 2 * width
+    return (struct.pack("<4sI4s", b"RIFF", 4 + len(fmt_chunk) + 8 + data_bytes, b"WAVE")
+            + fmt_chunk + struct.pack("<4sI", b"data", data_bytes))
+
+
+class CallRecorder:
+    """
+    Tees caller and agent audio onto one timeline and writes stereo WAV.
+
+    Both tracks live in per-call mulaw buffers indexed by sample position
+    since the call started: caller audio is appended as it arrives, agent
+    audio is placed where it will play (OutboundAudioWriter reports that),
+    and a Twilio clear erases agent audio that will now never play. Once a
+    second, the settled part of the timeline is handed to the recorder
+    thread, which interleaves, converts and writes it at its offset in a
+    file preallocated for RECORDING_PREALLOC_S. At most max_buffer_ms of
+    audio waits for that thread; beyond it chunks are dropped and counted,
+    never queued without bound, and their span is written as silence.
+    Time spent on the event loop is measured in `loop_time`.
+    """
+
+    def __init__(self, directory=RECORDING_DIR, fmt=RECORDING_FORMAT,
+                 prealloc_s=RECORDING_PREALLOC_S, max_buffer_ms=RECORDING_MAX_BUFFER_MS,
+                 clock=time.monotonic, log=log):
+        self.fmt = fmt
+        self.clock = clock
+        self.log = log
+        self.started_at = clock()
+        self.max_pending = max_buffer_ms * SAMPLES_PER_MS
+        name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.wav"
+        self.path = os.path.join(directory, name)
+
+        self._base = 0  # sample position of _inbound[0] / _outbound[0]
+        self._inbound = bytearray()
+        self._outbound = bytearray()
+        self._in_cursor = None
+        self._last_flush = self.started_at
+        # Samples handed to the thread (loop side) and written (thread side);
+        # each counter has a single writer, so no lock is needed.
+        self._submitted = 0
+        self._written = 0
+        self._header_len = len(wav_header(fmt, 0))
+        self._width = 1 if fmt == "mulaw" else 2
+        self._file = _io.submit(self._open, directory, prealloc_s)
+
+        self.loop_time = Histogram()
+        self.write_time = Histogram()
+        self.dropped_ms = 0
+        self.frames_written = 0
+
+    # --- event loop side ---
+    def write_inbound(self, mulaw):
+        started = time.perf_counter()
+        if self._in_cursor is None:
+            self._in_cursor = self._position(self.clock())
+        self._place(self._inbound, self._in_cursor, mulaw)
+        self._in_cursor += len(mulaw)
+        if self.clock() - self._last_flush >= FLUSH_INTERVAL:
+            self._flush(final=False)
+        self.loop_time.observe(time.perf_counter() - started)
+
+    def write_outbound(self, mulaw, play_at):
+        started = time.perf_counter()
+        self._place(self._outbound, self._position(play_at), mulaw)
+        self.loop_time.observe(time.perf_counter() - started)
+
+    def clear_outbound(self, at):
+        """Twilio dropped everything not yet played at `at`."""
+        cut = self._position(at) - self._base
+        if 0 <= cut < len(self._outbound):
+            del self._outbound[cut:]
+
+    def close(self):
+        started = time.perf_counter()
+        self._flush(final=True)
+        _io.submit(self._finish)
+        self.loop_time.observe(time.perf_counter() - started)
+        self.log.info("🎙️ Recording → %s %s", self.path, self.stats())
+
+    def stats(self):
+        return {
+            "seconds": round(self._base / RATE, 1),
+            "dropped_ms": self.dropped_ms,
+            "loop_max_us": round(self.loop_time.max_ms * 1000, 1),
+            "loop_total_ms": round(self.loop_time.total_ms, 2),
+            "thread_write": self.write_time.summary(),
+        }
+
+    # --- internals ---
+    def _position(self, t):
+        return round((t - self.started_at) * RATE)
+
+    def _place(self, track, position, mulaw):
+        offset = position - self._base
+        if offset < 0:  # already flushed; keep only the unflushed tail
+            mulaw = mulaw[-offset:]
+            offset = 0
+        end = offset + len(mulaw)
+        if end > len(track):
+            track.extend(SILENCE * (end - len(track)))
+        track[offset:end] = mulaw
+
+    def _flush(self, final):
+        self._last_flush = self.clock()
+        if final:
+            settled = max(len(self._inbound), len(self._outbound))
+        else:
+            settled = min(self._position(self._last_flush - OUTBOUND_LEAD) - self._base, len(self._inbound))
+        if settled <= 0:
+            return
+        inbound, outbound = self._take(self._inbound, settled), self._take(self._outbound, settled)
+        position = self._base
+        self._base += settled
+        if self._submitted - self._written + settled > self.max_pending:
+            self.dropped_ms += settled // SAMPLES_PER_MS
+            _io.submit(self._silence, position, settled)
+            return
+        self._submitted += settled
+        _io.submit(self._write, position, inbound, outbound)
+
+    @staticmethod
+    def _take(track, n):
+        chunk = bytes(track[:n])
+        del track[:n]
+        if len(chunk) < n:
+            chunk += SILENCE * (n - len(chunk))
+        return chunk
+
+    # --- recorder thread ---
+    def _open(self, directory, prealloc_s):
+        os.makedirs(directory, exist_ok=True)
+        f = open(self.path, "w+b")
+        f.write(wav_header(self.fmt, 0))
+        size = self._header_len + prealloc_s * RATE * 2 * self._width
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+        except (AttributeError, OSError):
+            f.truncate(size)
+        return f
+
+    def _write(self, position, inbound, outbound):
+        started = time.perf_counter()
+        stereo = np.empty((len(inbound), 2), dtype=np.uint8)
+        stereo[:, 0] = np.frombuffer(inbound, dtype=np.uint8)
+        stereo[:, 1] = np.frombuffer(outbound, dtype=np.uint8)
+        data = stereo if self.fmt == "mulaw" else MULAW_TO_PCM[stereo]
+        f = self._file.result()
+        f.seek(self._header_len + position * 2 * self._width)
+        f.write(data.tobytes())
+        self.frames_written = max(self.frames_written, position + len(inbound))
+        self._written += len(inbound)
+        self.write_time.observe(time.perf_counter() - started)
+
+    def _silence(self, position, n):
+        # Unwritten file space reads as zeros: silence in PCM, but loud
+        # noise in mulaw, whose silence is 0xFF.
+        if self.fmt == "mulaw":
+            f = self._file.result()
+            f.seek(self._header_len + position * 2)
+            f.write(SILENCE * (2 * n))
+        self.frames_written = max(self.frames_written, position + n)
+
+    def _finish(self):
+        f = self._file.result()
+        f.seek(0)
+        f.write(wav_header(self.fmt, self.frames_written))
+        f.truncate(self._header_len + self.frames_written * 2 * self._width)
+        f.close()
+
+
+if __name__ == "__main__":
+    # Benchmark: event-loop stall with recording written inline vs through
+    # the recorder, for 50 concurrent calls streaming 20 ms frames.
+    import asyncio
+    import tempfile
+    import wave
+
+    from loadtest import loop_stalls
+
+    CALLS, SECONDS = 50, 5
+    frame = bytes(range(0, 160))
+
+    async def measure(run):
+        return max(await loop_stalls(run)) * 1000
+
+    async def call_inline(root, index):
+        with open(os.path.join(root, f"inline{index}.raw"), "wb") as f:
+            for _ in range(SECONDS * 50):
+                f.write(frame)
+                f.write(frame)
+                f.flush()
+                os.fsync(f.fileno())
+                await asyncio.sleep(0.02)
+
+    async def call_recorded(root, recorders):
+        recorder = CallRecorder(root)
+        recorders.append(recorder)
+        clock = recorder.clock
+        for _ in range(SECONDS * 50):
+            recorder.write_inbound(frame)
+            recorder.write_outbound(frame, clock() + 0.1)
+            await asyncio.sleep(0.02)
+        recorder.close()
+
+    async def main():
+        root = tempfile.mkdtemp()
+        recorders = []
+        inline = await measure(lambda: asyncio.gather(*(call_inline(root, i) for i in range(CALLS))))
+        recorded = await measure(lambda: asyncio.gather(*(call_recorded(root, recorders) for _ in range(CALLS))))
+        _io.shutdown(wait=True)
+        loop_us = max(r.loop_time.max_ms for r in recorders) * 1000
+        print(f"worst loop stall: inline writes {inline:.2f} ms, recorder {recorded:.2f} ms "
+              f"(recorder's own max {loop_us:.0f} µs per call on the loop)")
+        with wave.open(recorders[0].path) as w:
+            print(f"{recorders[0].path}: {w.getnchannels()} ch, {w.getframerate()} Hz, "
+                  f"{w.getnframes() / w.getframerate():.1f} s, dropped {sum(r.dropped_ms for r in recorders)} ms")
+
+    asyncio.run(main())
@@ -0,0 +1,178 @@
+import asyncio
+import inspect
+import time
+import uuid
+
+from relay_log import CallLog, flush_logging
+
+# ------------------------------------------------------------------
+# Per-call supervisor for the relay tasks
+# ------------------------------------------------------------------
+class CallSession:
+    """
+    Owns one call's relay tasks and both sockets.
+
+    `wait()` returns as soon as any task finishes (Twilio hung up, Deepgram
+    closed, a loop crashed); leaving the `async with` block then cancels the
+    remaining tasks, runs the registered cleanups (e.g. saving the dialog),
+    closes both sockets, records how long teardown took and waits until
+    the call's log lines are written. `log` is the call's CallLog; the
+    session binds its call id to it.
+    """
+
+    def __init__(self, twilio_ws, sts_ws, call_id=None, log=None):
+        self.call_id = call_id or uuid.uuid4().hex[:12]
+        self.log = log if log is not None else CallLog()
+        self.log.bind(call_id=self.call_id)
+        self.twilio_ws = twilio_ws
+        self.sts_ws = sts_ws
+        self.tasks = []
+        self.background = []
+        self.cleanups = []
+        self.started_at = time.monotonic()
+        self.ended_by = None
+        self.teardown_ms = None
+        self._closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def spawn(self, coro, name, background=False):
+        """Start a task; background tasks are cancelled at teardown but never end the call."""
+        task = asyncio.create_task(coro, name=f"{name}:{self.call_id}")
+        (self.background if background else self.tasks).append(task)
+
+    def add_cleanup(self, fn):
+        """Register a sync or async callable to run once at teardown."""
+        self.cleanups.append(fn)
+
+    async def wait(self):
+        """Block until the first task finishes and report how it ended."""
+        if not self.tasks:
+            return
+        done, _ = await asyncio.wait(self.tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            self.ended_by = task.get_name().split(":")[0]
+            if not task.cancelled() and task.exception() is not None:
+                self.log.error("❌ %s failed: %r", task.get_name(), task.exception())
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        started = time.monotonic()
+
+        tasks = self.tasks + self.background
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        for fn in reversed(self.cleanups):
+            try:
+                result = fn()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                self.log.error("❌ Cleanup %s failed: %s", getattr(fn, "__name__", fn), e)
+
+        for ws in (self.sts_ws, self.twilio_ws):
+            try:
+                await ws.close()
+            except Exception:
+                pass
+
+        self.teardown_ms = (time.monotonic() - started) * 1000
+        duration = time.monotonic() - self.started_at
+        self.log.info("🧹 Call ended by %s after %.1fs, teardown %.1f ms",
+                      self.ended_by or "error", duration, self.teardown_ms)
+        await flush_logging()
+
+
+if __name__ == "__main__":
+    # Soak test: drive server.twilio_handler through thousands of calls with
+    # in-memory sockets and check that tasks and memory stay flat.
+    import base64
+    import contextlib
+    import gc
+    import io
+    import json
+    import os
+    import tempfile
+    import tracemalloc
+
+    os.chdir(tempfile.mkdtemp())
+    import server
+
+    MEDIA = json.dumps({
+        "event": "media",
+        "media": {"track": "inbound", "payload": base64.b64encode(bytes(160)).decode("ascii")},
+    }, separators=(",", ":"))
+
+    class FakeTwilio:
+        def __init__(self, frames=50):
+            self.messages = [json.dumps({"event": "start", "start": {"streamSid": "MZtest"}})]
+            self.messages += [MEDIA] * frames
+            self.messages.append(json.dumps({"event": "stop"}))
+
+        def __aiter__(self):
+            return self._iter()
+
+        async def _iter(self):
+            for message in self.messages:
+                yield message
+                await asyncio.sleep(0)
+            # Twilio hangs up without closing cleanly; the socket just ends.
+
+        async def send(self, message):
+            pass
+
+        async def close(self):
+            pass
+
+    class FakeAgent:
+        def __init__(self):
+            self.closed = asyncio.Event()
+
+        def __aiter__(self):
+            return self._iter()
+
+        async def _iter(self):
+            await self.closed.wait()
+            return
+            yield
+
+        async def send(self, message):
+            pass
+
+        async def close(self):
+            self.closed.set()
+
+    async def fake_acquire():
+        return FakeAgent(), True
+
+    server.acquire_sts = fake_acquire
+
+    async def soak(calls):
+        for _ in range(calls):
+            await server.twilio_handler(FakeTwilio())
+
+    async def main():
+        with contextlib.redirect_stdout(io.StringIO()):
+            await soak(200)  # warm up caches and allocator pools
+        gc.collect()
+        tracemalloc.start()
+        base_tasks = len(asyncio.all_tasks())
+        base_mem = tracemalloc.get_traced_memory()[0]
+        for round_ in range(1, 6):
+            with contextlib.redirect_stdout(io.StringIO()):
+                await soak(1000)
+            gc.collect()
+            mem = tracemalloc.get_traced_memory()[0]
+            tasks = len(asyncio.all_tasks())
+            print(f"after {round_ * 1000:5d} calls: tasks {tasks} (start {base_tasks}), "
+                  f"traced memory {(mem - base_mem) / 1024:+.1f} KiB")
+
+    asyncio.run(main())
@@ -0,0 +1,252 @@
+import glob
+import json
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+# ------------------------------------------------------------------
+# Indexed call-record store (SQLite, WAL)
+# ------------------------------------------------------------------
+CALL_STORE_PATH = os.getenv("CALL_STORE_PATH", "data/calls.db")
+
+# Ids are unique per kind: a contact and a dialog may share one (e.g. two
+# files named after the same call's timestamp).
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id         TEXT NOT NULL,
+    kind       TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    day        TEXT NOT NULL,
+    phone      TEXT,
+    email      TEXT,
+    name       TEXT,
+    data       TEXT NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+CREATE INDEX IF NOT EXISTS records_id ON records (id);
+CREATE INDEX IF NOT EXISTS records_phone ON records (phone, created_at);
+CREATE INDEX IF NOT EXISTS records_email ON records (email, created_at);
+CREATE INDEX IF NOT EXISTS records_day ON records (day);
+CREATE INDEX IF NOT EXISTS records_kind_created ON records (kind, created_at);
+"""
+
+
+def normalize_phone(phone):
+    """Digits only, US numbers without the leading country code; None if unusable."""
+    digits = re.sub(r"\D", "", phone or "")
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    return digits if len(digits) >= 7 else None
+
+
+def normalize_email(email):
+    email = (email or "").strip().lower()
+    return email if "@" in email else None
+
+
+def new_call_id():
+    """Sortable and unique even when several calls finish in the same second."""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+
+class CallStore:
+    """
+    Call records (captured contacts, dialogs) with secondary indexes on
+    normalized phone, email and date.
+
+    Writes come from the write-behind thread through sink(). Every thread
+    gets its own connection, and WAL mode lets lookups on the event loop run
+    alongside a write.
+    """
+
+    def __init__(self, path=CALL_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    # --- writes ---
+    def insert_many(self, kind, records):
+        """Insert records in one transaction; ids already present for `kind` are skipped."""
+        rows = [self._row(kind, record) for record in records]
+        with self._write_lock:
+            conn = self._connect()
+            with conn:
+                cursor = conn.executemany(
+                    "INSERT OR IGNORE INTO records (id, kind, created_at, day, phone, email, name, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+        return cursor.rowcount
+
+    def sink(self, kind):
+        """A WriteBehindWriter sink storing a stream's records as `kind`."""
+        return StoreSink(self, kind)
+
+    @staticmethod
+    def _row(kind, record):
+        record_id = record.get("id") or record.get("callId") or new_call_id()
+        created_at = record.get("savedAt") or datetime.now().isoformat()
+        return (
+            record_id,
+            kind,
+            created_at,
+            created_at[:10],
+            normalize_phone(record.get("phoneNumber") or record.get("caller")),
+            normalize_email(record.get("email")),
+            record.get("fullName"),
+            json.dumps(record),
+        )
+
+    # --- lookups ---
+    def get(self, record_id, kind=None):
+        if kind:
+            rows = self._query("SELECT id, kind, data FROM records WHERE kind = ? AND id = ?", (kind, record_id))
+        else:
+            rows = self._query("SELECT id, kind, data FROM records WHERE id = ? ORDER BY kind", (record_id,))
+        return rows[0] if rows else None
+
+    def find_by_phone(self, phone, kind=None, limit=20):
+        return self._find("phone", normalize_phone(phone), kind, limit)
+
+    def find_by_email(self, email, kind=None, limit=20):
+        return self._find("email", normalize_email(email), kind, limit)
+
+    def find_by_day(self, day, kind=None, limit=1000):
+        """All records from one YYYY-MM-DD day."""
+        return self._find("day", day, kind, limit)
+
+    def iter_records(self, kind, since=None):
+        """Records of one kind (saved at or after `since`), oldest first, streamed from a cursor."""
+        cursor = self._connect().execute(
+            "SELECT id, data FROM records WHERE kind = ? AND created_at >= ? ORDER BY created_at",
+            (kind, since or ""),
+        )
+        for record_id, data in cursor:
+            yield {"id": record_id, **json.loads(data)}
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def _find(self, column, value, kind, limit):
+        if value is None:
+            return []
+        sql = f"SELECT id, kind, data FROM records WHERE {column} = ?"
+        params = [value]
+        if kind:
+            sql += " AND kind = ?"
+            params.append(kind)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        return self._query(sql, params)
+
+    def _query(self, sql, params):
+        rows = self._connect().execute(sql, params).fetchall()
+        return [{"id": row[0], "kind": row[1], **json.loads(row[2])} for row in rows]
+
+
+class StoreSink:
+    """Adapter so WriteBehindWriter can write a stream into the store."""
+
+    def __init__(self, store, kind):
+        self.store = store
+        self.kind = kind
+
+    def write(self, records):
+        self.store.insert_many(self.kind, records)
+
+    def sync(self):
+        pass  # each batch is already one committed transaction
+
+    def close(self):
+        pass
+
+
+# ------------------------------------------------------------------
+# Migration of the older one-file-per-call JSON and JSONL segments
+# ------------------------------------------------------------------
+def migrate(store, calls_dir="data/calls", logs_dirs=("call_logs", "data/call_logs")):
+    """Ingest existing contact records and dialog logs; safe to run repeatedly."""
+    counts = {"contact": 0, "dialog": 0}
+    for kind, directories in (("contact", (calls_dir,)), ("dialog", logs_dirs)):
+        for directory in directories:
+            for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+                stem = os.path.splitext(os.path.basename(path))[0]
+                if isinstance(data, list):  # call_logs/*.json hold the bare dialog list
+                    data = {"dialog": data}
+                data.setdefault("id", stem)
+                data.setdefault("savedAt", _stamp_to_iso(stem))
+                counts[kind] += store.insert_many(kind, [data])
+            for path in sorted(glob.glob(os.path.join(directory, "*.jsonl"))):
+                with open(path, encoding="utf-8") as f:
+                    records = [json.loads(line) for line in f if line.strip()]
+                for i, record in enumerate(records):
+                    # Segment lines without an id get a stable one so re-runs skip them.
+                    if not record.get("id") and not record.get("callId"):
+                        record["id"] = f"{os.path.basename(path)}:{i}"
+                counts[kind] += store.insert_many(kind, records)
+    return counts
+
+
+def _stamp_to_iso(stem):
+    try:
+        return datetime.strptime(stem[:15], "%Y%m%d_%H%M%S").isoformat()
+    except ValueError:
+        return datetime.now().isoformat()
+
+
+# Process-wide store
+store = CallStore()
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    import time
+
+    if sys.argv[1:2] == ["migrate"]:
+        counts = migrate(store)
+        print(f"✅ Migrated {counts} into {store.path} ({store.count()} records total)")
+        sys.exit(0)
+
+    # Benchmark: phone lookups at a million records.
+    N = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    bench = CallStore(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    started = time.perf_counter()
+    batch = []
+    for i in range(N):
+        batch.append({
+            "id": f"bench_{i}",
+            "savedAt": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}T10:00:00",
+            "fullName": f"Patient {i}",
+            "phoneNumber": f"+1617{i:07d}",
+            "email": f"patient{i}@example.com",
+        })
+        if len(batch) == 10_000:
+            bench.insert_many("contact", batch)
+            batch.clear()
+    bench.insert_many("contact", batch)
+    print(f"inserted {N} records in {time.perf_counter() - started:.1f}s")
+
+    lookups = 20_000
+    started = time.perf_counter()
+    for i in range(lookups):
+        bench.find_by_phone(f"+1 617 {(i * 7919) % N:07d}")
+    per_lookup = (time.perf_counter() - started) / lookups * 1e6
+    print(f"find_by_phone: {per_lookup:.1f} µs per lookup")
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import os
+import time
+
+from call_store import store
+from patient_index import patients
+from relay_log import log
+
+# ------------------------------------------------------------------
+# Caller-context prefetch on the Twilio start event
+# ------------------------------------------------------------------
+CALLER_PREFETCH_BUDGET_MS = int(os.getenv("CALLER_PREFETCH_BUDGET_MS", "300"))
+
+# <Stream><Parameter name="caller" value="{{From}}"/></Stream> in the TwiML
+CALLER_PARAMETERS = ("caller", "From", "from", "callerNumber")
+
+
+def caller_from_start(start):
+    """The caller's number from the start event's customParameters, if any."""
+    params = start.get("customParameters") or {}
+    for key in CALLER_PARAMETERS:
+        if params.get(key):
+            return params[key]
+    return None
+
+
+def summarize(matches, history):
+    """
+    One compact paragraph for the agent prompt, or None if nothing is known.
+    Caller ID can be spoofed, so nothing identifying (name, email) goes in;
+    only whether the number is known, the patient type and contact dates.
+    """
+    lines = []
+    if matches:
+        patient = matches[0]
+        lines.append(
+            f"- This number is on file ({patient.get('patientType') or 'unknown'} patient),"
+            f" last contact {(patient.get('lastContact') or 'unknown')[:10]}."
+        )
+    if history:
+        last = history[0]
+        lines.append(f"- {len(history)} recent call(s) from this number, last on {last.get('savedAt', '')[:10]}.")
+    if not lines:
+        return None
+    return (
+        "CALLER CONTEXT (from our records, unverified caller ID):\n"
+        + "\n".join(lines)
+        + "\n- Still ask for the caller's name and contact details as usual."
+    )
+
+
+async def fetch_caller_context(phone):
+    matches = patients.lookup(phone=phone, limit=1)
+    history = await asyncio.to_thread(store.find_by_phone, phone, "dialog", 3)
+    return summarize(matches, history)
+
+
+async def inject_caller_context(sts_ws, phone, settings_ready, budget_ms=CALLER_PREFETCH_BUDGET_MS, log=log):
+    """
+    Resolve the caller's records and send them as an UpdatePrompt once
+    Deepgram has applied Settings. Only the lookup is budgeted: if it takes
+    longer than `budget_ms` the context is skipped.
+
+    The Twilio start event that carries the caller's number arrives after
+    Settings (and its greeting) went out, so the context reaches the agent
+    while the greeting plays and shapes the turns after it, not the
+    greeting itself.
+    """
+    started = time.monotonic()
+    try:
+        summary = await asyncio.wait_for(fetch_caller_context(phone), budget_ms / 1000)
+    except asyncio.TimeoutError:
+        log.info("⏱️ Caller prefetch skipped after %d ms budget", budget_ms)
+        return
+    except Exception as e:
+        log.warning("⚠️ Caller prefetch failed: %s", e)
+        return
+    lookup_ms = (time.monotonic() - started) * 1000
+
+    if summary:
+        await settings_ready.wait()  # an UpdatePrompt before SettingsApplied is rejected
+        await sts_ws.send(json.dumps({"type": "UpdatePrompt", "prompt": summary}))
+    log.info("📇 Caller context %s (lookup %.0f ms)", "injected" if summary else "empty", lookup_ms)
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import time
+
+from agent_functions import FUNCTION_MAP
+from metrics import function_latency
+from relay_log import log
+
+# ------------------------------------------------------------------
+# Non-blocking FunctionCall dispatcher
+# ------------------------------------------------------------------
+DEFAULT_TIMEOUT = 5.0
+FUNCTION_TIMEOUTS = {
+    "capture_contact": 10.0,
+}
+
+
+class FunctionDispatcher:
+    """
+    Runs agent function calls as background tasks so the receive loop keeps
+    forwarding TTS audio while a tool runs.
+
+    Async functions run on the loop, plain functions in the default thread
+    pool; each gets a per-function timeout. Responses are sent in the order
+    the calls arrived, and per-function latency goes into
+    metrics.function_latency. `on_response(fn_name, seconds)` is called once
+    each response has been sent. Calls are logged to `log` (the call's CallLog).
+    """
+
+    def __init__(self, send, function_map=None, timeouts=None, default_timeout=DEFAULT_TIMEOUT,
+                 on_response=None, log=log):
+        self.send = send
+        self.log = log
+        self.on_response = on_response
+        self.function_map = FUNCTION_MAP if function_map is None else function_map
+        self.timeouts = FUNCTION_TIMEOUTS if timeouts is None else timeouts
+        self.default_timeout = default_timeout
+        self._tail = None  # completes once the previous response is sent
+        self._tasks = set()
+
+    def submit(self, decoded):
+        """Schedule every function call in a Deepgram FunctionCall(Request) message."""
+        if decoded.get("type") == "FunctionCallRequest":
+            # Agent API v1 shape: a list of calls, arguments as a JSON string.
+            for call in decoded.get("functions", []):
+                if call.get("client_side", True):
+                    try:
+                        params, error = json.loads(call.get("arguments") or "{}"), None
+                    except json.JSONDecodeError as e:
+                        # Answer the call with the error rather than end the receive loop.
+                        params, error = None, f"Invalid arguments: {e}"
+                    self._schedule(call.get("name"), call.get("id"), params, legacy=False, error=error)
+        else:
+            self._schedule(decoded.get("name"), decoded.get("id"), decoded.get("parameters", {}), legacy=True)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    # --- internals ---
+    def _schedule(self, fn_name, fn_id, params, legacy, error=None):
+        previous = self._tail
+        done = asyncio.get_running_loop().create_future()
+        self._tail = done
+        task = asyncio.create_task(self._run(fn_name, fn_id, params, legacy, previous, done, error))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, fn_name, fn_id, params, legacy, previous, done, error=None):
+        try:
+            self.log.info("⚙️ FunctionCall → %s", fn_name)
+            started = time.monotonic()
+            result = None
+            fn = self.function_map.get(fn_name)
+            if error is not None:
+                pass  # the call could not be decoded; answer with the error
+            elif fn is None:
+                error = f"Unknown function: {fn_name}"
+            else:
+                timeout = self.timeouts.get(fn_name, self.default_timeout)
+                try:
+                    result = await self._call(fn, params, timeout)
+                except asyncio.TimeoutError:
+                    error = f"{fn_name} timed out after {timeout:g}s"
+                except Exception as e:
+                    error = str(e)
+                function_latency[fn_name].observe(time.monotonic() - started)
+
+            response = self._response(fn_name, fn_id, result, error, legacy)
+
+            # Keep FunctionCallResponse order identical to request order.
+            if previous is not None:
+                await asyncio.shield(previous)
+            try:
+                await self.send(json.dumps(response))
+            except Exception as e:
+                self.log.error("❌ Could not send %s response: %s", fn_name, e)
+                return
+            if self.on_response is not None:
+                self.on_response(fn_name, time.monotonic() - started)
+            if error:
+                self.log.error("❌ Function %s failed: %s", fn_name, error)
+            else:
+                self.log.info("← Result (%.0f ms): %s", (time.monotonic() - started) * 1000, result)
+        finally:
+            if not done.done():
+                done.set_result(None)
+
+    @staticmethod
+    async def _call(fn, params, timeout):
+        if asyncio.iscoroutinefunction(fn):
+            return await asyncio.wait_for(fn(params), timeout)
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(loop.run_in_executor(None, fn, params), timeout)
+
+    @staticmethod
+    def _response(fn_name, fn_id, result, error, legacy):
+        if legacy:
+            response = {"type": "FunctionCallResponse", "name": fn_name}
+            if error:
+                response["error"] = error
+            else:
+                response["result"] = result
+            if fn_id:
+                response["id"] = fn_id  # echo back id if present
+            return response
+        content = json.dumps({"error": error} if error else result)
+        return {"type": "FunctionCallResponse", "id": fn_id, "name": fn_name, "content": content}
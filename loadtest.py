@@ -0,0 +1,361 @@
+import argparse
+import asyncio
+import base64
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import websockets
+
+from metrics import Histogram
+
+# ------------------------------------------------------------------
+# Offline load test: synthetic Twilio callers → relay → local fake agent
+# ------------------------------------------------------------------
+# The relay runs unmodified in its own process (server.py, or supervisor.py
+# with --workers) with DG_AGENT_URL pointed at a scripted stand-in for the
+# Deepgram agent. Callers stream 20 ms mulaw frames in real time; every
+# TURN_SECONDS of caller audio the agent "hears" the end of an utterance and
+# answers with TTS audio, so the caller can time end-to-end latency from
+# the boundary frame to the first agent audio it receives.
+ctx = multiprocessing.get_context("fork")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FRAME_BYTES = 160  # 20 ms of 8 kHz mulaw
+FRAME_SECONDS = 0.02
+TURN_SECONDS = 5.0
+TURN_BYTES = int(TURN_SECONDS / FRAME_SECONDS) * FRAME_BYTES
+GREETING_SECONDS = 2.0
+RESPONSE_SECONDS = 1.5
+FUNCTION_EVERY = 3  # every third turn makes a tool call first
+TTS_CHUNK_BYTES = 800  # 100 ms per message, sent at 2x real time
+
+
+# --- fake Deepgram agent -------------------------------------------
+async def _speak(ws, seconds):
+    chunk = bytes([0x7F]) * TTS_CHUNK_BYTES
+    for _ in range(int(seconds * 8000 / TTS_CHUNK_BYTES)):
+        await ws.send(chunk)
+        await asyncio.sleep(TTS_CHUNK_BYTES / 8000 / 2)
+    await ws.send(json.dumps({"type": "AgentAudioDone"}))
+
+
+async def _respond(ws, turn, function_done):
+    await ws.send(json.dumps({"type": "UserStartedSpeaking"}))
+    await ws.send(json.dumps({"type": "ConversationText", "role": "user", "content": f"caller turn {turn}"}))
+    if turn % FUNCTION_EVERY == 0:
+        function_done.clear()
+        await ws.send(json.dumps({
+            "type": "FunctionCallRequest",
+            "functions": [{"id": f"fc{turn}", "name": "check_office_hours", "arguments": "{}", "client_side": True}],
+        }))
+        try:
+            await asyncio.wait_for(function_done.wait(), 5)
+        except asyncio.TimeoutError:
+            pass
+    await ws.send(json.dumps({"type": "AgentStartedSpeaking", "total_latency": 0.0}))
+    await ws.send(json.dumps({"type": "ConversationText", "role": "assistant", "content": f"answer {turn}"}))
+    await _speak(ws, RESPONSE_SECONDS)
+
+
+async def fake_agent(ws):
+    tasks = set()
+    try:
+        async for message in ws:
+            if isinstance(message, str) and json.loads(message).get("type") == "Settings":
+                break
+        else:
+            return
+        await ws.send(json.dumps({"type": "SettingsApplied"}))
+        tasks.add(asyncio.create_task(_speak(ws, GREETING_SECONDS)))
+        function_done = asyncio.Event()
+        received, turn = 0, 0
+        async for message in ws:
+            if isinstance(message, bytes):
+                received += len(message)
+                while received >= (turn + 1) * TURN_BYTES:
+                    turn += 1
+                    task = asyncio.create_task(_respond(ws, turn, function_done))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            elif '"FunctionCallResponse"' in message:
+                function_done.set()
+    except websockets.exceptions.ConnectionClosed:
+        pass  # the relay tears calls down without a close handshake
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def agent_main(port):
+    async def serve():
+        async with websockets.serve(fake_agent, "127.0.0.1", port, max_queue=None):
+            await asyncio.Future()
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(serve())
+
+
+# --- synthetic Twilio callers --------------------------------------
+MEDIA_MESSAGE = json.dumps({
+    "event": "media",
+    "media": {"track": "inbound", "payload": base64.b64encode(bytes([0xFF]) * FRAME_BYTES).decode("ascii")},
+}, separators=(",", ":"))
+
+
+async def twilio_caller(url, index, seconds, result):
+    frames = int(seconds / FRAME_SECONDS)
+    boundary = [None]  # send time of the last frame of a caller utterance
+
+    async def receive(ws):
+        async for message in ws:
+            if boundary[0] is None or not message.startswith('{"event":"media"'):
+                continue
+            # Only whole 20 ms frames from OutboundAudioWriter count as agent audio.
+            payload = base64.b64decode(json.loads(message)["media"]["payload"])
+            if payload and len(payload) % FRAME_BYTES == 0:
+                result["latency"].observe(time.monotonic() - boundary[0])
+                boundary[0] = None
+
+    async with websockets.connect(url, max_queue=None) as ws:
+        await ws.send(json.dumps({"event": "start", "start": {
+            "streamSid": f"MZload{index}",
+            "customParameters": {"caller": f"+1617555{index % 10000:04d}"},
+        }}))
+        receiver = asyncio.create_task(receive(ws))
+        started = time.monotonic()
+        for seq in range(frames):
+            delay = started + seq * FRAME_SECONDS - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                result["lag"].observe(-delay)
+            await ws.send(MEDIA_MESSAGE)
+            if (seq + 1) * FRAME_BYTES % TURN_BYTES == 0:
+                boundary[0] = time.monotonic()
+        await ws.send(json.dumps({"event": "stop"}))
+        receiver.cancel()
+    result["completed"] += 1
+
+
+async def run_callers(url, first, count, seconds, ramp):
+    result = {"latency": Histogram(), "lag": Histogram(), "completed": 0, "errors": 0}
+
+    async def one(index):
+        await asyncio.sleep(ramp * (index - first) / max(1, count))
+        try:
+            await twilio_caller(url, index, seconds, result)
+        except Exception as e:
+            result["errors"] += 1
+            if result["errors"] <= 3:
+                print(f"❌ Caller {index}: {e!r}")
+
+    await asyncio.gather(*(one(i) for i in range(first, first + count)))
+    return result
+
+
+def callers_main(args):
+    return asyncio.run(run_callers(*args))
+
+
+# --- relay process accounting (Linux /proc) ------------------------
+def process_tree(pid):
+    pids, i = [pid], 0
+    while i < len(pids):
+        for task in _listdir(f"/proc/{pids[i]}/task"):
+            try:
+                with open(f"/proc/{pids[i]}/task/{task}/children") as f:
+                    pids += [int(p) for p in f.read().split()]
+            except OSError:
+                pass
+        i += 1
+    return pids
+
+
+def _listdir(path):
+    try:
+        return os.listdir(path)
+    except OSError:
+        return []
+
+
+def cpu_seconds(pids):
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            total += int(fields[11]) + int(fields[12])  # utime + stime
+        except OSError:
+            pass
+    return total / os.sysconf("SC_CLK_TCK")
+
+
+def rss_bytes(pids):
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            pass
+    return total
+
+
+# --- driver ---------------------------------------------------------
+def start_relay(args, workdir):
+    env = dict(
+        os.environ,
+        DG_API_KEY="loadtest",
+        DG_AGENT_URL=f"ws://127.0.0.1:{args.agent_port}",
+        PORT=str(args.port),
+        DATA_DIR=os.path.join(workdir, "data"),
+        CALL_STORE_PATH=os.path.join(workdir, "data", "calls.db"),
+    )
+    if args.workers:
+        env["RELAY_WORKERS"] = str(args.workers)
+        script = "supervisor.py"
+    else:
+        script = "server.py"
+    return subprocess.Popen(
+        [sys.executable, os.path.join(HERE, script)],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_for_port(port, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"relay did not open port {port}")
+
+
+async def loop_stalls(run, tick=0.001):
+    """
+    Await `run()` while a ticker sleeps `tick` at a time on the same loop;
+    returns how late each wake-up was, in seconds. The in-process benchmarks
+    (write_behind.py, call_recorder.py) use it to measure event-loop stalls.
+    """
+    stalls = []
+    running = True
+
+    async def ticker():
+        while running:
+            started = time.perf_counter()
+            await asyncio.sleep(tick)
+            stalls.append(time.perf_counter() - started - tick)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    try:
+        await run()
+    finally:
+        running = False
+        await task
+    return stalls
+
+
+def run_step(args, relay_pid, calls, idle_rss):
+    url = f"ws://127.0.0.1:{args.port}/twilio"
+    shares = [calls // args.client_procs + (i < calls % args.client_procs) for i in range(args.client_procs)]
+    jobs, first = [], 0
+    for share in shares:
+        if share:
+            jobs.append((url, first, share, args.duration, args.ramp))
+            first += share
+
+    with ctx.Pool(len(jobs)) as pool:
+        pending = pool.map_async(callers_main, jobs)
+        # Measure CPU and memory over the steady state, after the ramp.
+        time.sleep(args.ramp + 1)
+        pids = process_tree(relay_pid)
+        cpu_start, wall_start = cpu_seconds(pids), time.monotonic()
+        time.sleep(max(1.0, args.duration - args.ramp - 2))
+        pids = process_tree(relay_pid)
+        cpu = cpu_seconds(pids) - cpu_start
+        wall = time.monotonic() - wall_start
+        rss = rss_bytes(pids)
+        results = pending.get()
+
+    latency, lag = Histogram(), Histogram()
+    completed = errors = 0
+    for result in results:
+        latency.merge(result["latency"])
+        lag.merge(result["lag"])
+        completed += result["completed"]
+        errors += result["errors"]
+    return {
+        "calls": calls,
+        "completed": completed,
+        "errors": errors,
+        "cpu_pct": round(100 * cpu / wall, 1),
+        "cpu_ms_per_call_s": round(1000 * cpu / wall / calls, 2),
+        "rss_mb": round(rss / 2**20, 1),
+        "kb_per_call": round((rss - idle_rss) / 1024 / calls, 1),
+        "latency": latency.summary(),
+        "caller_lag_p99_ms": lag.percentile(99) or 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for the Twilio ↔ Deepgram relay")
+    parser.add_argument("--steps", default="10,25,50,100,200", help="concurrent calls per step")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds each call lasts")
+    parser.add_argument("--ramp", type=float, default=3.0, help="seconds over which a step's calls start")
+    parser.add_argument("--workers", type=int, default=0, help="run supervisor.py with N workers (0: one server.py)")
+    parser.add_argument("--client-procs", type=int, default=max(1, (os.cpu_count() or 2) // 4))
+    parser.add_argument("--slo-ms", type=float, default=500.0, help="p95 end-to-end latency budget")
+    parser.add_argument("--port", type=int, default=5090)
+    parser.add_argument("--agent-port", type=int, default=5091)
+    args = parser.parse_args()
+    steps = [int(n) for n in args.steps.split(",")]
+
+    agent = ctx.Process(target=agent_main, args=(args.agent_port,), daemon=True)
+    agent.start()
+    workdir = tempfile.mkdtemp(prefix="relay-loadtest-")
+    relay = start_relay(args, workdir)
+    try:
+        asyncio.run(wait_for_port(args.port))
+        time.sleep(1.0)  # let the STS pool fill
+        idle_rss = rss_bytes(process_tree(relay.pid))
+        print(f"🚀 Relay pid {relay.pid} ({args.workers or 1} process(es)), idle RSS {idle_rss / 2**20:.1f} MiB")
+
+        sustainable = 0
+        for calls in steps:
+            step = run_step(args, relay.pid, calls, idle_rss)
+            p95 = step["latency"]["p95_ms"]
+            ok = (step["errors"] == 0 and step["completed"] == calls
+                  and p95 is not None and p95 <= args.slo_ms)
+            print(f"{'✅' if ok else '❌'} {json.dumps(step)}")
+            if step["caller_lag_p99_ms"] > 20:
+                print("⚠️ Callers fell behind real time; add --client-procs before trusting this step")
+            if not ok:
+                break
+            sustainable = calls
+
+        cores = args.workers or 1
+        print(f"📊 Max sustainable concurrency: {sustainable} calls "
+              f"(p95 ≤ {args.slo_ms:g} ms), {sustainable / cores:.0f} calls per core")
+    finally:
+        relay.send_signal(signal.SIGTERM)
+        try:
+            relay.wait(10)
+        except subprocess.TimeoutExpired:
+            relay.kill()
+        agent.terminate()
+
+
+if __name__ == "__main__":
+    main()
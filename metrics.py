@@ -0,0 +1,73 @@
+import bisect
+
+# ------------------------------------------------------------------
+# Lightweight in-process latency histograms
+# ------------------------------------------------------------------
+# Upper bounds in milliseconds; the last bucket catches everything slower.
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float("inf"))
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; observe() is O(log buckets), no allocation."""
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def merge(self, other):
+        """Add another histogram with the same buckets into this one."""
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile (0-100)."""
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank and n:
+                return round(min(bound, self.max_ms), 2)
+        return round(self.max_ms, 2)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else None,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+class HistogramRegistry(dict):
+    """name → Histogram, created on first use."""
+
+    def __missing__(self, name):
+        hist = self[name] = Histogram()
+        return hist
+
+    def summary(self):
+        return {name: hist.summary() for name, hist in sorted(self.items())}
+
+
+# Process-wide registries
+function_latency = HistogramRegistry()
+turn_latency = HistogramRegistry()  # see call_metrics.CallMetrics
+barge_in_latency = HistogramRegistry()  # "local" (VAD) vs "upstream" (UserStartedSpeaking)
@@ -0,0 +1,204 @@
+import bisect
+import os
+import time
+from datetime import date, datetime, timedelta
+
+import pytz
+
+# ------------------------------------------------------------------
+# Office schedule: precomputed open/close transitions
+# ------------------------------------------------------------------
+OFFICE_TIMEZONE = os.getenv("OFFICE_TIMEZONE", "America/New_York")
+
+# Weekly hours as (open, close) in local hours; 12.5 means 12:30.
+OFFICE_HOURS = {
+    "Monday": (8, 16),
+    "Tuesday": (8, 17),
+    "Wednesday": (8, 19),
+    "Thursday": (8, 17),
+    "Friday": (8, 15),
+    "Saturday": (8, 14),
+    "Sunday": None,
+}
+
+# Per-location changes to the weekly table, e.g. {"chestnut-hill": {"Saturday": None}}
+LOCATION_HOURS = {}
+
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+def parse_overrides(spec):
+    """
+    Dated exceptions from "2026-12-25,2026-12-24=8-12": a bare date is closed
+    all day, date=open-close is a short day. Returns {date: None | (open, close)}.
+    """
+    overrides = {}
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        day, _, hours = item.partition("=")
+        day = date.fromisoformat(day.strip())
+        if hours:
+            start, end = hours.split("-")
+            overrides[day] = (float(start), float(end))
+        else:
+            overrides[day] = None
+    return overrides
+
+
+# Holidays and half-days: OFFICE_HOLIDAYS for every location,
+# OFFICE_HOLIDAYS_<LOCATION> (upper case, dashes as underscores) for one.
+HOLIDAYS = parse_overrides(os.getenv("OFFICE_HOLIDAYS", ""))
+
+
+class OfficeSchedule:
+    """
+    Open/close instants for the office, computed once for `horizon_days`
+    around the current date in the office timezone (DST handled by pytz).
+
+    status() is a bisect over the sorted transition list and the answer is
+    reused until the next transition, so the hot path is a comparison. The
+    clock is injected (epoch seconds) so behaviour at boundaries, holidays
+    and DST changes can be checked without waiting for them.
+    """
+
+    def __init__(self, weekly=OFFICE_HOURS, overrides=None, timezone=OFFICE_TIMEZONE,
+                 clock=time.time, horizon_days=60):
+        self.weekly = weekly
+        self.overrides = overrides or {}
+        self.tz = pytz.timezone(timezone)
+        self.clock = clock
+        self.horizon_days = horizon_days
+        self.transitions = []  # epoch seconds; even index opens, odd index closes
+        self._window = (0.0, 0.0)
+        self._cached = None  # (valid_from, valid_until, is_open, next_change)
+
+        self.builds = 0
+        self.lookups = 0
+        self.hits = 0
+
+    def hours_on(self, day):
+        if day in self.overrides:
+            return self.overrides[day]
+        return self.weekly.get(WEEKDAYS[day.weekday()])
+
+    def status(self, now=None):
+        """(is_open, next_change) for `now` (default: the clock); next_change is epoch seconds or None."""
+        t = self.clock() if now is None else now
+        self.lookups += 1
+        cached = self._cached
+        if cached is not None and cached[0] <= t < cached[1]:
+            self.hits += 1
+            return cached[2], cached[3]
+
+        if not self._window[0] <= t < self._window[1]:
+            self._build(t)
+        transitions = self.transitions
+        i = bisect.bisect_right(transitions, t)
+        is_open = i % 2 == 1
+        valid_from = transitions[i - 1] if i else self._window[0]
+        next_change = transitions[i] if i < len(transitions) else None
+        valid_until = self._window[1] if next_change is None else next_change
+        self._cached = (valid_from, valid_until, is_open, next_change)
+        return is_open, next_change
+
+    def is_open(self, now=None):
+        return self.status(now)[0]
+
+    def next_opening(self, now=None):
+        """Local datetime of the next opening (None if open now or nothing in the horizon)."""
+        t = self.clock() if now is None else now
+        is_open, next_change = self.status(t)
+        if is_open or next_change is None:
+            return None
+        return datetime.fromtimestamp(next_change, self.tz)
+
+    def invalidate(self):
+        self._window = (0.0, 0.0)
+        self._cached = None
+
+    # --- internals ---
+    def _build(self, t):
+        start_day = datetime.fromtimestamp(t, self.tz).date() - timedelta(days=1)
+        transitions = []
+        for offset in range(self.horizon_days + 1):
+            day = start_day + timedelta(days=offset)
+            hours = self.hours_on(day)
+            if not hours:
+                continue
+            opens, closes = (self._instant(day, h) for h in hours)
+            if transitions and transitions[-1] == opens:
+                transitions[-1] = closes  # back-to-back spans merge
+            else:
+                transitions += [opens, closes]
+
+        self.transitions = transitions
+        self._window = (self._instant(start_day, 0), self._instant(start_day + timedelta(days=self.horizon_days), 0))
+        self._cached = None
+        self.builds += 1
+
+    def _instant(self, day, hours):
+        minutes = round(hours * 60)
+        local = datetime(day.year, day.month, day.day) + timedelta(minutes=minutes)
+        return self.tz.localize(local).timestamp()
+
+
+_schedules = {}
+
+
+def schedule_for(location=None):
+    """The process-wide schedule for `location` (None: the main office)."""
+    schedule = _schedules.get(location)
+    if schedule is None:
+        weekly, overrides = OFFICE_HOURS, HOLIDAYS
+        if location:
+            weekly = {**OFFICE_HOURS, **LOCATION_HOURS.get(location, {})}
+            env = "OFFICE_HOLIDAYS_" + location.upper().replace("-", "_")
+            overrides = {**HOLIDAYS, **parse_overrides(os.getenv(env, ""))}
+        schedule = _schedules[location] = OfficeSchedule(weekly, overrides)
+    return schedule
+
+
+if __name__ == "__main__":
+    import timeit
+
+    tz = pytz.timezone("America/New_York")
+
+    def at(y, m, d, hh, mm=0):
+        return tz.localize(datetime(y, m, d, hh, mm)).timestamp()
+
+    now = [at(2026, 12, 21, 9)]  # Monday
+    schedule = OfficeSchedule(
+        overrides=parse_overrides("2026-12-25,2026-12-24=8-12.5"),
+        clock=lambda: now[0],
+    )
+
+    # Boundaries are half-open: open at 08:00:00, closed at 16:00:00.
+    assert schedule.is_open()
+    assert not schedule.is_open(at(2026, 12, 21, 7, 59))
+    assert schedule.is_open(at(2026, 12, 21, 8))
+    assert not schedule.is_open(at(2026, 12, 21, 16))
+    # Half-day and holiday.
+    assert schedule.is_open(at(2026, 12, 24, 12, 15))
+    assert not schedule.is_open(at(2026, 12, 24, 12, 30))
+    assert not schedule.is_open(at(2026, 12, 25, 10))
+    assert schedule.next_opening(at(2026, 12, 24, 13)) == tz.localize(datetime(2026, 12, 26, 8))
+    # Sunday, and across the spring DST change.
+    assert schedule.next_opening(at(2027, 3, 14, 10)) == tz.localize(datetime(2027, 3, 15, 8))
+    assert schedule.is_open(at(2027, 3, 15, 8, 30))
+    # Per-location weekly override.
+    LOCATION_HOURS["satellite"] = {"Saturday": None}
+    assert schedule_for("satellite").hours_on(date(2026, 12, 26)) is None
+    print("✅ schedule checks passed")
+
+    def legacy():
+        current = datetime.now(tz)
+        hours = OFFICE_HOURS.get(current.strftime("%A"))
+        return bool(hours) and hours[0] <= current.hour < hours[1]
+
+    live = OfficeSchedule()
+    for name, fn in (("pytz per call", legacy), ("OfficeSchedule", live.is_open)):
+        per_call = timeit.timeit(fn, number=100_000) / 100_000 * 1e6
+        print(f"{name:15s} {per_call:6.2f} µs per call")
+    print(f"cache hits {live.hits}/{live.lookups}, builds {live.builds}")
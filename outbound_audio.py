@@ -0,0 +1,147 @@
+import asyncio
+import binascii
+import json
+import time
+
+MULAW_BYTES_PER_MS = 8
+MULAW_SILENCE = 0xFF
+
+# ------------------------------------------------------------------
+# Paced, frame-aligned writer for agent audio → Twilio
+# ------------------------------------------------------------------
+class OutboundAudioWriter:
+    """
+    Re-slices agent TTS audio into `frame_ms` mulaw frames and paces them to
+    Twilio so that at most `max_lead_ms` of audio is queued on Twilio's side.
+
+    Up to `coalesce_frames` frames are sent per media message, serialized from
+    an envelope template built once for the stream. Keeping Twilio's buffer
+    short means a `clear` on barge-in cuts off only the last few hundred ms.
+    An optional `recorder` (call_recorder.CallRecorder) is told what was sent
+    and when it will play, and where a clear cut playback off.
+    """
+
+    def __init__(self, twilio_ws, streamsid, frame_ms=20, coalesce_frames=5,
+                 max_lead_ms=240, clock=time.monotonic, recorder=None):
+        self.twilio_ws = twilio_ws
+        self.streamsid = streamsid
+        self.frame_size = frame_ms * MULAW_BYTES_PER_MS
+        self.frame_seconds = frame_ms / 1000
+        # A message never carries more than max_lead_ms of audio, or it could never be sent.
+        self.coalesce_frames = max(1, min(coalesce_frames, int(max_lead_ms // frame_ms)))
+        self.max_lead = max_lead_ms / 1000
+        self.clock = clock
+        self.recorder = recorder
+
+        self._prefix = '{"event":"media","streamSid":' + json.dumps(streamsid) + ',"media":{"payload":"'
+        self._suffix = '"}}'
+        self._clear_message = json.dumps({"event": "clear", "streamSid": streamsid})
+
+        self._pending = bytearray()
+        self._playout_end = 0.0  # when Twilio should finish playing what it has
+        self._ready = asyncio.Event()
+        self._task = None
+
+        self.frames_sent = 0
+        self.messages_sent = 0
+        self.clears = 0
+        self._first_send_at = None
+        self._generation = 0  # bumped by clear(); a send it overtook is not counted
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def write(self, audio):
+        """Queue agent audio for paced delivery."""
+        self._pending += audio
+        self._ready.set()
+
+    async def clear(self):
+        """Drop unsent audio and tell Twilio to discard what it has queued."""
+        self._pending.clear()
+        self._playout_end = self.clock()
+        self._generation += 1
+        self.clears += 1
+        if self.recorder is not None:
+            self.recorder.clear_outbound(self._playout_end)
+        await self.twilio_ws.send(self._clear_message)
+
+    def is_playing(self):
+        """True while agent audio is queued here or still playing at Twilio."""
+        return bool(self._pending) or self._playout_end > self.clock()
+
+    def buffered_ms(self):
+        """Estimated audio queued at Twilio that has not been played yet."""
+        return max(0.0, self._playout_end - self.clock()) * 1000
+
+    def stats(self):
+        now = self.clock()
+        elapsed = now - self._first_send_at if self._first_send_at else 0.0
+        buffered_ms = self.buffered_ms()
+        return {
+            "frames_sent": self.frames_sent,
+            "messages_sent": self.messages_sent,
+            "frames_per_sec": round(self.frames_sent / elapsed, 1) if elapsed else 0.0,
+            "twilio_buffered_ms": round(buffered_ms, 1),
+            "twilio_buffered_bytes": int(buffered_ms * MULAW_BYTES_PER_MS),
+            "pending_bytes": len(self._pending),
+            "clears": self.clears,
+        }
+
+    # --- internals ---
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._ready.clear()
+                await self._ready.wait()
+
+            available = len(self._pending) // self.frame_size
+            if available == 0:
+                # A trailing partial frame: give the next TTS chunk one frame
+                # time to complete it, then pad with silence to stay aligned.
+                self._ready.clear()
+                try:
+                    await asyncio.wait_for(self._ready.wait(), self.frame_seconds)
+                    continue
+                except asyncio.TimeoutError:
+                    if not self._pending:
+                        continue  # a clear() emptied it while we waited
+                    pad = self.frame_size - len(self._pending)
+                    self._pending.extend(bytes((MULAW_SILENCE,)) * pad)
+                    available = 1
+
+            now = self.clock()
+            lead = max(0.0, self._playout_end - now)
+            batch = min(available, self.coalesce_frames)
+            room = int((self.max_lead - lead) / self.frame_seconds)
+            if room < batch and lead > 0:
+                # With max_lead_ms under one frame, a frame goes once Twilio is empty.
+                await asyncio.sleep(min(lead, (batch - room) * self.frame_seconds))
+                continue
+
+            n = batch * self.frame_size
+            payload = binascii.b2a_base64(self._pending[:n], newline=False).decode("ascii")
+            play_at = max(self._playout_end, now)
+            if self.recorder is not None:
+                self.recorder.write_outbound(self._pending[:n], play_at)
+            del self._pending[:n]
+            generation = self._generation
+            await self.twilio_ws.send(self._prefix + payload + self._suffix)
+            if generation != self._generation:
+                continue  # cleared while sending: Twilio dropped this batch too
+
+            self._playout_end = play_at + batch * self.frame_seconds
+            self.frames_sent += batch
+            self.messages_sent += 1
+            if self._first_send_at is None:
+                self._first_send_at = now
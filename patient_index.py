@@ -0,0 +1,197 @@
+import asyncio
+import bisect
+import os
+import re
+import time
+from datetime import datetime, timedelta
+
+from call_store import normalize_email, normalize_phone
+
+# Each supervisor worker has its own index; lookups pull contacts other
+# workers captured from the shared store at most this often.
+PATIENT_INDEX_REFRESH_S = float(os.getenv("PATIENT_INDEX_REFRESH_S", "5"))
+# Re-read this far behind the newest record seen: write-behind commits can
+# land slightly out of savedAt order across workers.
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+# ------------------------------------------------------------------
+# In-memory patient index for in-call lookups
+# ------------------------------------------------------------------
+def name_key(name):
+    return re.sub(r"\s+", " ", (name or "").strip().lower())
+
+
+class PatientIndex:
+    """
+    Hash indexes on normalized phone and email plus a sorted name list for
+    prefix search (full name and last name), built from captured-contact
+    records. Lookups never touch the disk, so lookup_patient answers well
+    inside a millisecond; capture_contact adds new records incrementally
+    and refresh() picks up those captured by other worker processes.
+
+    Contact details are only returned for a phone or email match. A match
+    on name alone says just whether such a patient exists, so a caller who
+    knows a name cannot have someone else's number or email read out.
+    """
+
+    def __init__(self):
+        self.records = {}  # id → (fullName, phone, email, patientType, savedAt)
+        self.by_phone = {}
+        self.by_email = {}
+        self.names = []  # sorted (name_key, id)
+        self.loaded = False
+        self.newest = ""  # latest savedAt indexed
+        self.refreshed_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.records)
+
+    def load(self, store):
+        """Bulk-load every captured contact from the call store (run off the loop)."""
+        names = []
+        for record in store.iter_records("contact"):
+            names.extend(self._add(record))
+        self.names = sorted(self.names + names)
+        self.loaded = True
+        return len(self.records)
+
+    def add(self, record):
+        for key in self._add(record):
+            bisect.insort(self.names, key)
+
+    async def refresh(self, store, max_age=PATIENT_INDEX_REFRESH_S):
+        """Add contacts saved since the last refresh, if that was over `max_age` ago."""
+        if time.monotonic() - self.refreshed_at < max_age:
+            return 0
+        self.refreshed_at = time.monotonic()
+        since = None
+        if self.newest:
+            try:
+                since = (datetime.fromisoformat(self.newest) - REFRESH_OVERLAP).isoformat()
+            except ValueError:
+                pass
+        records = await asyncio.to_thread(lambda: list(store.iter_records("contact", since)))
+        before = len(self.records)
+        for record in records:
+            self.add(record)
+        return len(self.records) - before
+
+    def lookup(self, phone=None, email=None, name=None, limit=5):
+        """Matches for any of phone / email / name prefix, most specific first."""
+        ids = []
+        if phone:
+            ids += self.by_phone.get(normalize_phone(phone), ())
+        if email:
+            ids += self.by_email.get(normalize_email(email), ())
+        contact_ids = set(ids)
+        if name and len(ids) < limit:
+            prefix = name_key(name)
+            if prefix:
+                i = bisect.bisect_left(self.names, (prefix, ""))
+                while i < len(self.names) and self.names[i][0].startswith(prefix) and len(ids) < limit * 4:
+                    ids.append(self.names[i][1])
+                    i += 1
+
+        matches, seen = [], set()
+        for record_id in ids:
+            if record_id in seen:
+                continue
+            seen.add(record_id)
+            full_name, phone_, email_, patient_type, saved_at = self.records[record_id]
+            match = {"patientType": patient_type, "lastContact": saved_at}
+            if record_id in contact_ids:
+                match.update(fullName=full_name, phoneNumber=phone_, email=email_)
+            matches.append(match)
+            if len(matches) == limit:
+                break
+        return matches
+
+    # --- internals ---
+    def _add(self, record):
+        record_id = record.get("id")
+        if not record_id or record_id in self.records:
+            return []
+        full_name = record.get("fullName") or ""
+        phone = normalize_phone(record.get("phoneNumber"))
+        email = normalize_email(record.get("email"))
+        saved_at = record.get("savedAt")
+        self.records[record_id] = (full_name, phone, email, record.get("patientType"), saved_at)
+        if saved_at and saved_at > self.newest:
+            self.newest = saved_at
+        if phone:
+            self.by_phone.setdefault(phone, []).append(record_id)
+        if email:
+            self.by_email.setdefault(email, []).append(record_id)
+
+        keys = []
+        key = name_key(full_name)
+        if key:
+            keys.append((key, record_id))
+            last = key.rsplit(" ", 1)
+            if len(last) == 2:
+                keys.append((last[1], record_id))
+        return keys
+
+
+# Process-wide index, loaded by server.main() and fed by capture_contact
+patients = PatientIndex()
+
+
+if __name__ == "__main__":
+    import random
+    import tracemalloc
+
+    N = 100_000
+    first = ["john", "jane", "maria", "wei", "aisha", "carlos", "olga", "sam", "priya", "liam"]
+    last = ["doe", "smith", "garcia", "chen", "khan", "silva", "ivanova", "lee", "patel", "murphy"]
+    random.seed(7)
+
+    tracemalloc.start()
+    index = PatientIndex()
+    started = time.perf_counter()
+    for i in range(N):
+        index.add({
+            "id": f"p{i}",
+            "fullName": f"{random.choice(first).title()} {random.choice(last).title()}{i}",
+            "phoneNumber": f"+1617{i:07d}",
+            "email": f"patient{i}@example.com",
+            "patientType": "new",
+            "savedAt": "2025-10-16T18:26:43",
+        })
+    build = time.perf_counter() - started
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{N} patients indexed in {build:.2f}s, {memory / N:.0f} bytes per patient "
+          f"({memory / 1024 / 1024:.1f} MiB)")
+
+    for label, kwargs in (
+        ("phone", lambda i: {"phone": f"(617) {i:07d}"}),
+        ("email", lambda i: {"email": f"Patient{i}@Example.com"}),
+        ("name prefix", lambda i: {"name": f"{first[i % 10]} "}),
+    ):
+        lookups = 20_000
+        started = time.perf_counter()
+        for i in range(lookups):
+            index.lookup(**kwargs(i % N))
+        print(f"lookup by {label:11s} {(time.perf_counter() - started) / lookups * 1e6:6.1f} µs")
+
+    # Name-only matches never expose contact details; phone matches do.
+    named = index.lookup(name="john")
+    assert named and all(set(m) == {"patientType", "lastContact"} for m in named), named[:1]
+    assert index.lookup(phone="+16170000001")[0]["phoneNumber"] == "6170000001"
+
+    # A contact saved by another worker shows up after refresh().
+    import tempfile
+
+    from call_store import CallStore
+
+    shared = CallStore(os.path.join(tempfile.mkdtemp(), "calls.db"))
+    shared.insert_many("contact", [{"id": "a", "fullName": "Ann Lee", "phoneNumber": "6175550100",
+                                    "savedAt": "2025-10-16T10:00:00"}])
+    worker = PatientIndex()
+    worker.load(shared)
+    shared.insert_many("contact", [{"id": "b", "fullName": "Bo Chen", "phoneNumber": "6175550101",
+                                    "savedAt": "2025-10-16T10:00:05"}])
+    added = asyncio.run(worker.refresh(shared, max_age=0))
+    assert added == 1 and worker.lookup(phone="6175550101"), added
+    print("✅ name-only lookups hide contact details; refresh() picks up other workers' contacts")
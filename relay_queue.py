@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+from metrics import Histogram
+from sts_pool import KEEPALIVE_MESSAGE
+
+# ------------------------------------------------------------------
+# Bounded per-call audio queue between Twilio and Deepgram
+# ------------------------------------------------------------------
+POLICIES = ("drop_oldest", "keepalive", "teardown")
+
+
+class QueueOverflow(Exception):
+    """Raised by the `teardown` policy when the upstream cannot keep up."""
+
+
+class BoundedAudioQueue:
+    """
+    asyncio.Queue with a fixed capacity and an explicit overflow policy.
+
+    - drop_oldest: discard the oldest frame to make room for the new one.
+    - keepalive:   discard the whole backlog and queue a KeepAlive in its
+                   place, so Deepgram gets fresh audio instead of a late burst.
+    - teardown:    raise QueueOverflow and let the call end.
+
+    The time each item waits before get() is recorded in `delay`.
+    """
+
+    def __init__(self, maxsize=20, policy="drop_oldest"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown audio queue policy: {policy}")
+        self.policy = policy
+        self._queue = asyncio.Queue(maxsize)
+        self.delay = Histogram()
+
+        self.high_water = 0
+        self.dropped = 0
+        self.overflows = 0
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def put_frame(self, frame):
+        queue = self._queue
+        if queue.full():
+            self.overflows += 1
+            if self.policy == "teardown":
+                raise QueueOverflow(f"audio queue full ({queue.maxsize} frames)")
+            if self.policy == "drop_oldest":
+                queue.get_nowait()
+                self.dropped += 1
+            else:
+                while not queue.empty():
+                    if not isinstance(queue.get_nowait()[1], str):
+                        self.dropped += 1
+                queue.put_nowait((time.monotonic(), KEEPALIVE_MESSAGE))
+
+        queue.put_nowait((time.monotonic(), frame))
+        self.high_water = max(self.high_water, queue.qsize())
+
+    async def get(self):
+        queued_at, frame = await self._queue.get()
+        self.delay.observe(time.monotonic() - queued_at)
+        return frame
+
+    def stats(self):
+        return {
+            "policy": self.policy,
+            "maxsize": self._queue.maxsize,
+            "depth": self._queue.qsize(),
+            "high_water": self.high_water,
+            "dropped_frames": self.dropped,
+            "overflows": self.overflows,
+        }
@@ -1,228 +1,364 @@
 import asyncio
-import base64
+import binascii
+import http
 import json
 import websockets
 import os
+import signal
 from dotenv import load_dotenv
-from datetime import datetime
-import pytz
-from agent_functions import get_office_status
+from agent_settings import SettingsCache
+from function_dispatcher import FunctionDispatcher
+from sts_pool import StsPool
+from audio_buffer import InboundFramer
+from outbound_audio import OutboundAudioWriter
+from twilio_codec import decode_twilio
+from relay_queue import BoundedAudioQueue
+from call_session import CallSession
+from write_behind import writer
+from call_store import store
+from patient_index import patients
+from caller_context import caller_from_start, inject_caller_context
+from vad import LOCAL_VAD, SILENCE_SUPPRESSION, BargeInMonitor, SilenceGate
+from metrics import barge_in_latency, function_latency, turn_latency
+from call_metrics import CallMetrics
+from call_capture import CALL_CAPTURE_DIR, CallCapture
+from call_recorder import RECORDING_DIR, CallRecorder
+from transcript_log import TRANSCRIPT_STREAM, TranscriptLog, TranscriptSink
+from relay_log import CallLog, configure_logging, log, shutdown_logging
 
 load_dotenv()
 
+# Overridable so loadtest.py can point the relay at a local agent stand-in.
+DG_AGENT_URL = os.getenv("DG_AGENT_URL", "wss://agent.deepgram.com/v1/agent/converse")
+
+STS_POOL_SIZE = int(os.getenv("STS_POOL_SIZE", "2"))
+STS_POOL_PRECONFIGURE = os.getenv("STS_POOL_PRECONFIGURE", "0") == "1"
+STS_POOL_MAX_IDLE = float(os.getenv("STS_POOL_MAX_IDLE", "30"))
+STS_POOL_REFILL_RATE = float(os.getenv("STS_POOL_REFILL_RATE", "2"))
+
+# Inbound audio is batched into INBOUND_FRAME_MS frames (20 ms = Twilio's
+# native packet) and flushed early once INBOUND_MAX_DELAY_MS has passed.
+INBOUND_FRAME_MS = int(os.getenv("INBOUND_FRAME_MS", "100"))
+INBOUND_MAX_DELAY_MS = int(os.getenv("INBOUND_MAX_DELAY_MS", str(INBOUND_FRAME_MS)))
+
+# At most AUDIO_QUEUE_MAX_MS of inbound audio waits for the Deepgram socket;
+# AUDIO_QUEUE_POLICY (drop_oldest | keepalive | teardown) decides what happens
+# when it stalls beyond that.
+AUDIO_QUEUE_MAX_MS = int(os.getenv("AUDIO_QUEUE_MAX_MS", "2000"))
+AUDIO_QUEUE_POLICY = os.getenv("AUDIO_QUEUE_POLICY", "drop_oldest")
+
+# Agent audio is sent to Twilio in 20 ms frames, OUTBOUND_COALESCE_FRAMES per
+# media message, keeping at most OUTBOUND_MAX_LEAD_MS queued at Twilio.
+OUTBOUND_COALESCE_FRAMES = int(os.getenv("OUTBOUND_COALESCE_FRAMES", "5"))
+OUTBOUND_MAX_LEAD_MS = int(os.getenv("OUTBOUND_MAX_LEAD_MS", "240"))
+
+PORT = int(os.getenv("PORT", "5000"))
+# Plain HTTP GET on this path returns this process's latency histograms as JSON.
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
+
+sts_pool = None
+settings_cache = SettingsCache()  # prompt and function definitions looked up per render
+writer.register(TRANSCRIPT_STREAM, TranscriptSink(store))
+active_calls = 0
+call_counter = None  # multiprocessing.Value shared with supervisor.py
+
 def sts_connect():
     api_key = os.getenv('DG_API_KEY')
     if not api_key:
         raise ValueError("DG_API_KEY environment variable is not set")
 
     return websockets.connect(
-        "wss://agent.deepgram.com/v1/agent/converse",
+        DG_AGENT_URL,
         subprotocols=["token", api_key]
     )
 
 
+async def acquire_sts():
+    """Return (sts_ws, settings_applied), taking a pre-warmed socket when one is idle."""
+    if sts_pool is None:
+        return await sts_connect(), False
+    return await sts_pool.acquire()
+
+
+def build_settings():
+    """Render the agent Settings message for a new call."""
+    return settings_cache.render()
+
+
 async def twilio_handler(twilio_ws):
-    audio_queue = asyncio.Queue()
-    streamsid_queue = asyncio.Queue()
-    dialog_history = []
-
-    async with sts_connect() as sts_ws:
-        # --- get current date and office status ---
-        tz = pytz.timezone("America/New_York")
-        now = datetime.now(tz)
-        current_date = now.strftime("%A, %B %d, %Y %I:%M %p")
-        within_hours, current_time = get_office_status()
-        office_status = "OPEN" if within_hours else "CLOSED"
-
-        # --- build prompt with dynamic date and office status ---
-        system_prompt = f"""
-        CURRENT DATE AND TIME CONTEXT:
-        - Today is {current_date}. Use this as context when discussing appointments and office hours.
-        - The office is currently {office_status} (as of {current_time}).
-        - When referencing dates to callers, use relative terms like "tomorrow", "next Tuesday", or "this Friday" if within 7 days.
-
-        PERSONALITY & TONE:
-        - Warm, professional, and friendly — like a real dental receptionist.
-        - Speak naturally and conversationally; avoid robotic listing or instructions.
-        - Show empathy, patience, and enthusiasm for new patients.
-        - Use natural affirmations like "Sure", "Got it", "No problem!" when appropriate.
-
-        CALL FLOW & LOGIC:
-        1. Greeting: "Hello, thank you for calling Brookline Progressive Dental! How can I help you today?"
-        - Let caller speak first.
-        - Clarify politely if request is unclear.
-
-        2. Identify Patient Type:
-        - Ask: "Just so I can best assist, are you a new patient or have you visited us before?"
-        - Record as patientType: "new", "existing", or "other".
-
-        3. For New Patients:
-        - Express enthusiasm.
-        - Collect full name, phone, email, and reason.
-        - Validate email and phone internally; if invalid, ask naturally to repeat.
-
-        4. Office Hours Handling:
-        - Office is currently {office_status}.
-        - If CLOSED: "Our office is currently closed. Could I still get your details so we can follow up?"
-        - If OPEN: continue collecting and validating info, then say "Thank you! I'll forward your details to our team now."
-
-        5. Ending Call:
-        - End naturally if caller says "bye" or "thank you".
-        - Ensure all required info collected and validated before ending.
-
-        DATA CAPTURE & INTERNAL RULES:
-        - Store: patientType, fullName, phoneNumber, email, reason, preferredDays, preferredTimes, servicesInterested, source.
-        - Missing info → "Unknown".
-        - Never reveal validation rules or backend logic to caller.
-        - **Always speak directly to the caller using their first name naturally once known.**
-          Do NOT refer to them in the third person.
-          Example: Say "Bashi, may I have your phone number?" NOT "What might be the reason for Bashi's visit?"
-
-        VALIDATION & CLARIFICATION:
-        - If info invalid, ask naturally: "I might have misheard your email/phone — could you repeat that?"
-        - Proceed only once required fields are valid.
-
-        BEHAVIORAL GUIDELINES:
-        - Calm, empathetic, human.
-        - Use fillers naturally.
-        - Do NOT interrupt caller.
-        - Avoid phrases like "Let me check that"; transition naturally.
-        - **Always address the caller in first person / direct speech.**
-        - NEVER switch to third-person references for the caller.
-
-        EXAMPLES OF GOOD RESPONSES:
-        - "Hi there! Thanks for calling Brookline Progressive Dental. How can I help you today?"
-        - "That's wonderful! We love welcoming new patients."
-        - "Can I have your full name please?"
-        - "I might have misheard your email — could you repeat that for me?"
-        - "Thank you! I'll forward your details to our team now."
-        """
-
-        # --- send settings to Deepgram ---
-        config_message = {
-            "type": "Settings",
-            "audio": {
-                "input": {"encoding": "mulaw", "sample_rate": 8000},
-                "output": {"encoding": "mulaw", "sample_rate": 8000, "container": "none"},
-            },
-            "agent": {
-                "language": "en",
-                "listen": {"provider": {"type": "deepgram", "model": "nova-3"}},
-                "think": {
-                    "provider": {"type": "open_ai", "model": "gpt-4o", "temperature": 0.7},
-                    "prompt": system_prompt,
-                },
-                "speak": {"provider": {"type": "deepgram", "model": "aura-2-thalia-en"}},
-                "greeting": "Hi there! Thanks for calling Brookline Progressive Dental. How can I help you today?"
-            },
-        }
-
-        await sts_ws.send(json.dumps(config_message))
+    audio_queue = BoundedAudioQueue(max(2, AUDIO_QUEUE_MAX_MS // INBOUND_FRAME_MS), AUDIO_QUEUE_POLICY)
+    streamsid_queue = asyncio.Queue(maxsize=1)
+    call_info = {}
+    settings_ready = asyncio.Event()
+    barge_in = BargeInMonitor() if LOCAL_VAD else None
+    silence_gate = None
+    if SILENCE_SUPPRESSION:
+        # With local VAD on, the gate reads the monitor's detector, which
+        # already sees every inbound payload, instead of running its own.
+        silence_gate = SilenceGate(barge_in.vad, feed_vad=False) if barge_in else SilenceGate()
+
+    sts_ws, settings_applied = await acquire_sts()
+    call_log = CallLog()  # the session binds the call id
+    capture = CallCapture(CALL_CAPTURE_DIR, log=call_log) if CALL_CAPTURE_DIR else None
+    if capture is not None:
+        twilio_ws, sts_ws = capture.wrap(twilio_ws, sts_ws)
+    recorder = CallRecorder(RECORDING_DIR, log=call_log) if RECORDING_DIR else None
+    async with CallSession(twilio_ws, sts_ws, log=call_log) as session:
+        call_metrics = CallMetrics(session.call_id)
+        transcript = TranscriptLog(session.call_id)
+        if settings_applied:
+            settings_ready.set()
+        else:
+            await sts_ws.send(build_settings())
 
         # --- Simplified sender loop ---
         async def sts_sender(sts_ws):
             while True:
                 chunk = await audio_queue.get()
+                call_log.sampled("upstream", "⬆️ Upstream send, %d queued", audio_queue.qsize())
                 try:
                     await sts_ws.send(chunk)
                 except websockets.exceptions.ConnectionClosedOK:
-                    print("⚠️ STS sender closed")
+                    call_log.warning("⚠️ STS sender closed")
                     break
 
-        # --- Simplified receiver loop (no FunctionCall handling) ---
+        # --- Receiver loop; function calls run beside it via the dispatcher ---
         async def sts_receiver(sts_ws):
             streamsid = await streamsid_queue.get()
-            async for message in sts_ws:
-                if isinstance(message, str):
-                    decoded = json.loads(message)
-                    msg_type = decoded.get("type")
-
-                    if msg_type == "SettingsApplied":
-                        print("✅ Deepgram settings applied")
-                        continue
-
-                    if msg_type == "UserStartedSpeaking":
-                        clear_message = {"event": "clear", "streamSid": streamsid}
-                        await twilio_ws.send(json.dumps(clear_message))
-                        continue
-
-                    # Send text responses from AI as TTS
-                    if msg_type == "ConversationText":
-                        content = decoded.get("content")
-                        print(f"\n🤖 AI: {content}\n")
-                        dialog_history.append({"role": "ai", "text": content})
-                        media_message = {
-                            "event": "media",
-                            "streamSid": streamsid,
-                            "media": {"payload": base64.b64encode(content.encode()).decode("ascii")},
-                        }
-                        await twilio_ws.send(json.dumps(media_message))
-
-                else:
-                    # Binary audio already handled by Deepgram
-                    raw_mulaw = message
-                    media_message = {
-                        "event": "media",
-                        "streamSid": streamsid,
-                        "media": {"payload": base64.b64encode(raw_mulaw).decode("ascii")},
-                    }
-                    await twilio_ws.send(json.dumps(media_message))
+            dispatcher = FunctionDispatcher(sts_ws.send, on_response=call_metrics.function_response, log=call_log)
+            outbound = OutboundAudioWriter(
+                twilio_ws, streamsid,
+                coalesce_frames=OUTBOUND_COALESCE_FRAMES,
+                max_lead_ms=OUTBOUND_MAX_LEAD_MS,
+                recorder=recorder,
+            ).start()
+            call_info["outbound"] = outbound
+            try:
+                async for message in sts_ws:
+                    if isinstance(message, str):
+                        decoded = json.loads(message)
+                        msg_type = decoded.get("type")
+
+                        if msg_type == "SettingsApplied":
+                            call_log.info("✅ Deepgram settings applied")
+                            settings_ready.set()
+                            continue
+
+                        if msg_type == "UserStartedSpeaking":
+                            call_metrics.user_started_speaking()
+                            if barge_in is not None:
+                                barge_in.on_upstream()
+                            await outbound.clear()
+                            continue
+
+                        if msg_type in ("FunctionCall", "FunctionCallRequest"):
+                            dispatcher.submit(decoded)
+                            continue
+
+                        if msg_type == "AgentStartedSpeaking":
+                            call_metrics.agent_started_speaking(decoded)
+                            continue
+
+                        if msg_type == "AgentAudioDone":
+                            call_metrics.agent_audio_done()
+                            continue
+
+                        # Transcript lines only; the agent's speech arrives as binary audio
+                        if msg_type == "ConversationText":
+                            content = decoded.get("content")
+                            if decoded.get("role") == "user":
+                                call_metrics.user_text()
+                                transcript.append("user", content)
+                                call_log.info("🗣 User: %s", content)
+                            else:
+                                transcript.append("ai", content)
+                                call_log.info("🤖 AI: %s", content)
+
+                    else:
+                        # Binary audio already handled by Deepgram; paced out in 20 ms frames
+                        if barge_in is not None and barge_in.muting(message):
+                            continue  # rest of the response the caller interrupted
+                        call_metrics.agent_audio()
+                        call_log.sampled("agent_audio", "🔊 Agent audio, %d bytes", len(message))
+                        outbound.write(message)
+            finally:
+                call_log.info("📊 Outbound audio: %s", outbound.stats())
+                await dispatcher.close()
+                await outbound.close()
 
         # --- Twilio receiver remains the same ---
         async def twilio_receiver(twilio_ws):
-            BUFFER_SIZE = 20 * 160
-            inbuffer = bytearray(b"")
+            # The ring must outlive every frame still sitting in audio_queue.
+            framer = InboundFramer(
+                INBOUND_FRAME_MS, INBOUND_MAX_DELAY_MS,
+                buffered_ms=max(10_000, 2 * AUDIO_QUEUE_MAX_MS),
+            )
+            call_info["framer"] = framer
             async for message in twilio_ws:
                 try:
-                    data = json.loads(message)
-                    # Capture streamSid
-                    if data.get("event") == "start":
+                    event, data = decode_twilio(message)
+
+                    # Handle raw audio (fast path, >99% of messages)
+                    if event == "media":
+                        if data is None:
+                            continue
+                        call_log.sampled("media", "🎧 Inbound media, %d base64 chars", len(data))
+                        if barge_in is None and recorder is None:
+                            frames = framer.push_b64(data)
+                        else:
+                            audio = binascii.a2b_base64(data)
+                            frames = framer.push(audio)
+                            if recorder is not None:
+                                recorder.write_inbound(audio)
+                            # Caller talking over the agent: cut playback now.
+                            outbound = call_info.get("outbound")
+                            if barge_in is not None and barge_in.on_audio(audio) and outbound is not None and outbound.is_playing():
+                                barge_in.local_clear()
+                                await outbound.clear()
+                        for frame in frames:
+                            if silence_gate is None:
+                                audio_queue.put_frame(frame)
+                            else:
+                                for item in silence_gate.filter(frame):
+                                    audio_queue.put_frame(item)
+                        continue
+
+                    # Capture streamSid and prefetch what we know about the caller
+                    if event == "start":
                         streamsid_queue.put_nowait(data["start"]["streamSid"])
+                        call_log.bind(stream_sid=data["start"]["streamSid"])
+                        call_log.info("📞 Stream started")
+                        caller = caller_from_start(data["start"])
+                        if caller:
+                            call_info["caller"] = caller
+                            session.spawn(
+                                inject_caller_context(sts_ws, caller, settings_ready, log=call_log),
+                                "caller_prefetch", background=True,
+                            )
 
                     # If Twilio sends transcription
-                    if data.get("event") == "transcript":
-                        transcript = data.get("text")
-                        print(f"\n🗣 User: {transcript}\n")
-                        dialog_history.append({"role": "user", "text": transcript})
-
-                    # Handle raw audio (existing)
-                    if data.get("event") == "media" and data["media"]["track"] == "inbound":
-                        chunk = base64.b64decode(data["media"]["payload"])
-                        inbuffer.extend(chunk)
-                    while len(inbuffer) >= BUFFER_SIZE:
-                        audio_queue.put_nowait(inbuffer[:BUFFER_SIZE])
-                        inbuffer = inbuffer[BUFFER_SIZE:]
-
-                    # Save dialog at end of call
-                    if data.get("event") == "stop":
-                        filename = f"call_logs/{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-                        os.makedirs("call_logs", exist_ok=True)
-                        with open(filename, "w") as f:
-                            json.dump(dialog_history, f, indent=2)
-                        print(f"\n💾 Dialog saved to {filename}\n")
+                    if event == "transcript":
+                        text = data.get("text")
+                        call_log.info("🗣 User: %s", text)
+                        transcript.append("user", text)
+
+                    if event == "stop":
+                        frame = framer.flush()
+                        if frame is not None:
+                            audio_queue.put_frame(frame)
+                        call_log.info("📊 Inbound framing: %s", framer.stats())
+                        call_log.info("📊 Audio queue: %s", audio_queue.stats())
+                        if silence_gate is not None:
+                            call_log.info("📊 Silence suppression: %s", silence_gate.stats())
+                        if barge_in is not None:
+                            call_log.info("📊 Barge-in: %s, %s", barge_in.stats(), barge_in_latency.summary())
 
                 except Exception as e:
-                    print(f"❌ Twilio receiver error: {e}")
+                    call_log.error("❌ Twilio receiver error: %s", e)
                     break
 
-        await asyncio.wait([
-            asyncio.ensure_future(sts_sender(sts_ws)),
-            asyncio.ensure_future(sts_receiver(sts_ws)),
-            asyncio.ensure_future(twilio_receiver(twilio_ws)),
-        ])
-
-        await twilio_ws.close()
+        # The transcript streamed out as the call went; finalize it however
+        # the call ended and the sink stores the complete dialog (written behind).
+        def save_dialog():
+            transcript.finalize(caller=call_info.get("caller"))
+            call_log.info("💾 Dialog queued for %s (%d utterances, %d turns)", store.path, transcript.seq, transcript.turn)
+
+        # Per-call latency summary, written next to the dialog (data/call_metrics/)
+        def save_metrics():
+            call_metrics.include("upstream_queue", audio_queue.delay)
+            extra = {"caller": call_info.get("caller"), "audio_queue": audio_queue.stats()}
+            for name in ("framer", "outbound"):
+                if name in call_info:
+                    extra[name] = call_info[name].stats()
+            if silence_gate is not None:
+                extra["silence"] = silence_gate.stats()
+            if capture is not None:
+                extra["capture"] = capture.path
+            if recorder is not None:
+                extra["recording"] = {"path": recorder.path, **recorder.stats()}
+            writer.submit("call_metrics", call_metrics.summary(**extra))
+
+        if capture is not None:
+            session.add_cleanup(capture.close)
+        if recorder is not None:
+            session.add_cleanup(recorder.close)
+        session.add_cleanup(save_metrics)
+        session.add_cleanup(save_dialog)
+        session.spawn(sts_sender(sts_ws), "sts_sender")
+        session.spawn(sts_receiver(sts_ws), "sts_receiver")
+        session.spawn(twilio_receiver(twilio_ws), "twilio_receiver")
+        await session.wait()
 
 async def router(websocket):
-    print("Incoming connection")
-    await twilio_handler(websocket)
+    global active_calls
+    log.info("Incoming connection")
+    active_calls += 1
+    if call_counter is not None:
+        call_counter.value = active_calls
+    try:
+        await twilio_handler(websocket)
+    finally:
+        active_calls -= 1
+        if call_counter is not None:
+            call_counter.value = active_calls
+
+def metrics_snapshot():
+    return {
+        "pid": os.getpid(),
+        "active_calls": active_calls,
+        "turn_latency": turn_latency.summary(),
+        "function_latency": function_latency.summary(),
+        "barge_in_latency": barge_in_latency.summary(),
+        "sts_pool": sts_pool.stats() if sts_pool is not None else None,
+        "write_behind": writer.stats(),
+    }
+
+
+def process_request(connection, request):
+    """Answer GET METRICS_PATH over plain HTTP; everything else continues to the websocket handshake."""
+    if request.path.split("?", 1)[0] != METRICS_PATH:
+        return None
+    response = connection.respond(http.HTTPStatus.OK, json.dumps(metrics_snapshot()) + "\n")
+    response.headers["Content-Type"] = "application/json"
+    return response
+
+
+async def main(reuse_port=False, counter=None):
+    """Run the relay; the supervisor passes reuse_port and a shared call counter."""
+    global sts_pool, call_counter
+    call_counter = counter
+    configure_logging()
+    sts_pool = StsPool(
+        sts_connect,
+        size=STS_POOL_SIZE,
+        settings_factory=build_settings if STS_POOL_PRECONFIGURE else None,
+        max_idle=STS_POOL_MAX_IDLE,
+        refill_rate=STS_POOL_REFILL_RATE,
+        settings_version=settings_cache.version,
+    )
+    await sts_pool.start()
 
-async def main():
-    server = await websockets.serve(router, "0.0.0.0", 5000)
-    print("✅ Server started on wss://voice.tasloflow.com")
+    loaded = await asyncio.to_thread(patients.load, store)
+    log.info("✅ Patient index loaded (%d records)", loaded)
 
-    # Run forever
-    await asyncio.Future()  # keeps the server alive
+    server = await websockets.serve(
+        router, "0.0.0.0", PORT, reuse_port=reuse_port, process_request=process_request,
+    )
+    log.info("✅ Server started on wss://voice.tasloflow.com")
+
+    # Run until SIGTERM (docker, systemd, the supervisor) or Ctrl+C, then
+    # end the calls in flight so their cleanups run before the drain.
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    try:
+        await stop.wait()
+        log.info("👋 SIGTERM received, closing %d active call(s)", active_calls)
+    finally:
+        server.close()
+        await server.wait_closed()
+        await sts_pool.close()  # idle pre-warmed agent sockets
+        await writer.close()  # drain queued call records and dialogs
+        shutdown_logging()
 
 
 if __name__ == "__main__":
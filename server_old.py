@@ -4,11 +4,16 @@ import json
 import websockets
 import os
 from dotenv import load_dotenv
-from agent_functions import FUNCTION_DEFINITIONS, FUNCTION_MAP, get_office_status
+from agent_functions import FUNCTION_DEFINITIONS, get_office_status
+from function_dispatcher import FunctionDispatcher
 from prompt import build_receptionist_prompt
+from relay_queue import BoundedAudioQueue
 
 load_dotenv()
 
+AUDIO_QUEUE_MAX_MS = int(os.getenv("AUDIO_QUEUE_MAX_MS", "2000"))
+AUDIO_QUEUE_POLICY = os.getenv("AUDIO_QUEUE_POLICY", "drop_oldest")
+
 def sts_connect():
     api_key = os.getenv('DG_API_KEY')
     if not api_key:
@@ -21,8 +26,8 @@ def sts_connect():
     return sts_ws
 
 async def twilio_handler(twilio_ws):
-    audio_queue = asyncio.Queue()
-    streamsid_queue = asyncio.Queue()
+    audio_queue = BoundedAudioQueue(max(2, AUDIO_QUEUE_MAX_MS // 400), AUDIO_QUEUE_POLICY)  # 400 ms frames
+    streamsid_queue = asyncio.Queue(maxsize=1)
 
     async with sts_connect() as sts_ws:
         within_hours, current_time = get_office_status()
@@ -198,6 +203,7 @@ async def twilio_handler(twilio_ws):
         async def sts_receiver(sts_ws):
             print("sts_receiver started")
             streamsid = await streamsid_queue.get()
+            dispatcher = FunctionDispatcher(sts_ws.send)
 
             async for message in sts_ws:
                 try:
@@ -212,49 +218,9 @@ async def twilio_handler(twilio_ws):
                             print("✅ Deepgram settings applied. Ready to process audio.")
                             continue
 
-                        # ✅ Handle function calls from Deepgram
-                        if msg_type == "FunctionCall":
-                            fn_name = decoded.get("name")
-                            fn_id = decoded.get("id")
-                            params = decoded.get("parameters", {})
-
-                            print(f"\n⚙️ FunctionCall → {fn_name}")
-                            print(f"→ Params: {json.dumps(params, indent=2)}")
-
-                            if fn_name in FUNCTION_MAP:
-                                fn = FUNCTION_MAP[fn_name]
-                                try:
-                                    # Run async or sync function safely
-                                    if asyncio.iscoroutinefunction(fn):
-                                        result = await fn(params)
-                                    else:
-                                        result = fn(params)
-
-                                    response = {
-                                        "type": "FunctionCallResponse",
-                                        "name": fn_name,
-                                        "result": result,
-                                    }
-                                    if fn_id:
-                                        response["id"] = fn_id  # echo back id if present
-
-                                    await sts_ws.send(json.dumps(response))
-                                    print(f"← Result: {json.dumps(result, indent=2)}")
-
-                                except Exception as e:
-                                    error_response = {
-                                        "type": "FunctionCallResponse",
-                                        "name": fn_name,
-                                        "error": str(e),
-                                    }
-                                    if fn_id:
-                                        error_response["id"] = fn_id
-                                    await sts_ws.send(json.dumps(error_response))
-                                    print(f"❌ Function {fn_name} failed: {e}")
-
-                            else:
-                                print(f"⚠️ Unknown function call: {fn_name}")
-
+                        # ✅ Handle function calls from Deepgram without blocking the audio path
+                        if msg_type in ("FunctionCall", "FunctionCallRequest"):
+                            dispatcher.submit(decoded)
                             continue
 
                         # ✅ Handle barge-in (user starts speaking mid-TTS)
@@ -330,7 +296,7 @@ async def twilio_handler(twilio_ws):
 
                     while len(inbuffer) >= BUFFER_SIZE:
                         chunk = inbuffer[:BUFFER_SIZE]
-                        audio_queue.put_nowait(chunk)
+                        audio_queue.put_frame(chunk)
                         inbuffer = inbuffer[BUFFER_SIZE:]
                 except:
                     break
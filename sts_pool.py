@@ -0,0 +1,206 @@
+import asyncio
+import json
+import time
+from collections import deque
+
+from websockets.protocol import State
+
+from relay_log import log
+
+# ------------------------------------------------------------------
+# Pre-warmed pool of Deepgram agent connections
+# ------------------------------------------------------------------
+KEEPALIVE_MESSAGE = json.dumps({"type": "KeepAlive"})
+
+
+class StsPool:
+    """
+    Keeps `size` agent sockets open ahead of incoming calls so a new
+    twilio_handler does not pay the TLS + websocket handshake.
+
+    If `settings_factory` is given, every pooled socket is also sent the
+    Settings message and held until SettingsApplied, so the call can start
+    streaming audio immediately; `settings_version()` (e.g.
+    SettingsCache.version) says when those Settings went out of date, and
+    sockets configured under an older version are retired. Idle sockets are
+    retired after `max_idle` seconds, before Deepgram's own idle timeout
+    closes them. Retired sockets are closed in the background, never on the
+    acquire() path. At most `refill_rate` sockets are opened per second; 0
+    opens them back to back.
+    """
+
+    def __init__(self, connect, size=2, settings_factory=None, max_idle=30.0,
+                 refill_rate=2.0, keepalive_interval=8.0, handshake_timeout=10.0,
+                 report_interval=60.0, settings_version=None):
+        self.connect = connect
+        self.size = size
+        self.settings_factory = settings_factory
+        self.settings_version = settings_version
+        self.max_idle = max_idle
+        if refill_rate < 0:
+            raise ValueError(f"refill_rate must be >= 0, got {refill_rate}")
+        self.refill_rate = refill_rate
+        self.keepalive_interval = keepalive_interval
+        self.handshake_timeout = handshake_timeout
+        self.report_interval = report_interval
+
+        self._idle = deque()  # (sts_ws, opened_at, settings version)
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._closed = False
+        self._closing = set()  # background close() of retired sockets
+
+        self.hits = 0
+        self.misses = 0
+        self.opened = 0
+        self.retired = 0
+        self.failed = 0
+
+    @property
+    def preconfigured(self):
+        return self.settings_factory is not None
+
+    async def start(self):
+        if self.size > 0 and self._task is None:
+            self._task = asyncio.create_task(self._maintain())
+
+    async def close(self):
+        if self._task:
+            # Wait for the maintainer to stop so a socket it was opening is
+            # either closed by _open_one or already in _idle. The flag stops
+            # it too if a wait_for() it was in swallowed the cancellation.
+            self._closed = True
+            self._wakeup.set()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._idle:
+            self._retire(self._idle.popleft()[0])
+        await asyncio.gather(*self._closing, return_exceptions=True)
+
+    async def acquire(self):
+        """Return (sts_ws, settings_applied) for a new call."""
+        now = time.monotonic()
+        version = self._version()
+        while self._idle:
+            entry = self._idle.popleft()
+            if self._usable(entry, now, version):
+                self.hits += 1
+                self._wakeup.set()
+                return entry[0], self.preconfigured
+            self._retire(entry[0])
+
+        self.misses += 1
+        self._wakeup.set()
+        return await self.connect(), False
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "preconfigured": self.preconfigured,
+            "refill_rate": self.refill_rate,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else None,
+            "opened": self.opened,
+            "retired": self.retired,
+            "failed": self.failed,
+        }
+
+    # --- internals ---
+    async def _open_one(self):
+        version = self._version()
+        sts_ws = await self.connect()
+        if self.preconfigured:
+            try:
+                await sts_ws.send(self.settings_factory())
+                await asyncio.wait_for(self._wait_settings_applied(sts_ws), self.handshake_timeout)
+            except BaseException:
+                await sts_ws.close()
+                raise
+        self.opened += 1
+        self._idle.append((sts_ws, time.monotonic(), version))
+
+    @staticmethod
+    async def _wait_settings_applied(sts_ws):
+        async for message in sts_ws:
+            if isinstance(message, str) and json.loads(message).get("type") == "SettingsApplied":
+                return
+        raise ConnectionError("agent socket closed before SettingsApplied")
+
+    def _version(self):
+        return self.settings_version() if self.preconfigured and self.settings_version else None
+
+    def _usable(self, entry, now, version):
+        sts_ws, opened_at, configured = entry
+        return sts_ws.state is State.OPEN and now - opened_at < self.max_idle and configured == version
+
+    def _retire(self, sts_ws):
+        self.retired += 1
+        task = asyncio.create_task(self._close_quietly(sts_ws))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_quietly(sts_ws):
+        try:
+            await sts_ws.close()
+        except Exception:
+            pass
+
+    def _retire_stale(self):
+        now = time.monotonic()
+        version = self._version()
+        fresh = deque()
+        while self._idle:
+            entry = self._idle.popleft()
+            if self._usable(entry, now, version):
+                fresh.append(entry)
+            else:
+                self._retire(entry[0])
+        self._idle = fresh
+
+    async def _keepalive(self):
+        # Configured sockets are idle sessions on Deepgram's side; KeepAlive
+        # stops them being closed for lack of audio while they wait.
+        if not self.preconfigured:
+            return
+        for sts_ws, _, _ in list(self._idle):
+            try:
+                await sts_ws.send(KEEPALIVE_MESSAGE)
+            except Exception:
+                pass
+
+    async def _maintain(self):
+        check_interval = min(self.keepalive_interval, self.max_idle / 2)
+        last_report = time.monotonic()
+        while not self._closed:
+            self._wakeup.clear()
+            self._retire_stale()
+            while len(self._idle) < self.size and not self._closed:
+                try:
+                    await self._open_one()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.failed += 1
+                    log.warning("⚠️ STS pool refill failed: %s", e)
+                    break
+                if self.refill_rate:
+                    await asyncio.sleep(1 / self.refill_rate)
+
+            await self._keepalive()
+
+            if time.monotonic() - last_report >= self.report_interval:
+                log.info("📊 STS pool: %s", self.stats())
+                last_report = time.monotonic()
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), check_interval)
+            except asyncio.TimeoutError:
+                pass
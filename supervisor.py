@@ -0,0 +1,113 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ------------------------------------------------------------------
+# Multi-process relay: N workers share port 5000 via SO_REUSEPORT
+# ------------------------------------------------------------------
+RELAY_WORKERS = int(os.getenv("RELAY_WORKERS", str(os.cpu_count() or 1)))
+REPORT_INTERVAL = float(os.getenv("RELAY_REPORT_INTERVAL", "30"))
+RESTART_BACKOFF_MAX = 30.0
+SHUTDOWN_TIMEOUT = float(os.getenv("RELAY_SHUTDOWN_TIMEOUT", "15"))  # per worker drain before SIGKILL
+
+# fork keeps startup cheap and lets workers inherit the shared counters.
+ctx = multiprocessing.get_context("fork")
+
+
+def worker_main(index, counter):
+    """Entry point of one worker process."""
+    import server
+
+    # Restarted workers are forked after supervise() installed its handlers;
+    # server.main() installs its own SIGTERM handler, which drains the worker.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor handles Ctrl+C
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    print(f"👷 Worker {index} started (pid {os.getpid()})")
+    asyncio.run(server.main(reuse_port=True, counter=counter))
+
+
+class Worker:
+    def __init__(self, index):
+        self.index = index
+        self.counter = ctx.Value("i", 0, lock=False)
+        self.process = None
+        self.restarts = 0
+        self.backoff = 1.0
+        self.next_start = 0.0
+        self.started_at = 0.0
+
+    def start(self):
+        self.counter.value = 0
+        self.process = ctx.Process(target=worker_main, args=(self.index, self.counter), daemon=True)
+        self.process.start()
+        self.started_at = time.monotonic()
+
+    def stats(self):
+        return {
+            "worker": self.index,
+            "pid": self.process.pid if self.process else None,
+            "alive": bool(self.process and self.process.is_alive()),
+            "active_calls": self.counter.value,
+            "restarts": self.restarts,
+        }
+
+
+def supervise(workers=RELAY_WORKERS, report_interval=REPORT_INTERVAL):
+    """Start `workers` relay processes, restart crashed ones, report active calls."""
+    pool = [Worker(i) for i in range(workers)]
+    for worker in pool:
+        worker.start()
+    print(f"✅ Supervisor started {workers} workers on port {os.getenv('PORT', '5000')}")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    last_report = time.monotonic()
+    while not stopping:
+        time.sleep(0.5)
+        now = time.monotonic()
+        for worker in pool:
+            if worker.process.is_alive():
+                # A worker that stayed up for a minute has earned a fresh backoff.
+                if now - worker.started_at > 60:
+                    worker.backoff = 1.0
+                continue
+            if worker.next_start == 0.0:
+                print(f"⚠️ Worker {worker.index} exited with code {worker.process.exitcode}, "
+                      f"restarting in {worker.backoff:.0f}s")
+                worker.next_start = now + worker.backoff
+                worker.backoff = min(worker.backoff * 2, RESTART_BACKOFF_MAX)
+            elif now >= worker.next_start:
+                worker.restarts += 1
+                worker.next_start = 0.0
+                worker.start()
+
+        if now - last_report >= report_interval:
+            total = sum(w.counter.value for w in pool)
+            print(f"📊 Active calls: {total} → {[w.stats() for w in pool]}")
+            last_report = now
+
+    print("\n👋 Stopping workers...")
+    for worker in pool:
+        if worker.process.is_alive():
+            worker.process.terminate()
+    for worker in pool:
+        worker.process.join(timeout=SHUTDOWN_TIMEOUT)
+        if worker.process.is_alive():
+            worker.process.kill()
+
+
+if __name__ == "__main__":
+    supervise()
@@ -1,4 +1,6 @@
 from agent_functions import FUNCTION_MAP
+from relay_log import configure_logging, shutdown_logging
+from write_behind import writer
 import asyncio
 
 async def test():
@@ -12,5 +14,8 @@ async def test():
         "reason": "teeth cleaning"
     }))
     print(await FUNCTION_MAP["end_call"]({"farewell_type": "bye"}))
+    await writer.close()
 
+configure_logging()
 asyncio.run(test())
+shutdown_logging()
@@ -0,0 +1,224 @@
+import glob
+import json
+import os
+import time
+from datetime import datetime
+
+from write_behind import DATA_DIR, writer
+
+# ------------------------------------------------------------------
+# Incremental per-call transcript log
+# ------------------------------------------------------------------
+# Every utterance is written as it happens through the write-behind
+# writer to DATA_DIR/transcripts/<callId>.jsonl, so a call that dies
+# mid-way still has its transcript on disk and nothing accumulates in
+# memory. When the call ends, the complete dialog is read back off the
+# event loop and stored as the call's "dialog" record.
+TRANSCRIPT_STREAM = "transcripts"
+TRANSCRIPT_DIR = os.path.join(DATA_DIR, TRANSCRIPT_STREAM)
+
+
+class TranscriptLog:
+    """
+    One call's transcript. append() submits an event with a sequence
+    number, a turn id (consecutive utterances by the same speaker share a
+    turn), seconds since the call started and a wall-clock time. finalize()
+    submits the end event carrying the dialog record's other fields; the
+    TranscriptSink completes and stores it.
+    """
+
+    def __init__(self, call_id, writer=writer, clock=time.monotonic):
+        self.call_id = call_id
+        self.writer = writer
+        self.clock = clock
+        self.started_at = clock()
+        self.seq = 0
+        self.turn = 0
+        self._role = None
+
+    def append(self, role, text):
+        if not text:
+            return
+        if role != self._role:
+            self.turn += 1
+            self._role = role
+        self.seq += 1
+        self.writer.submit(TRANSCRIPT_STREAM, {
+            "callId": self.call_id,
+            "seq": self.seq,
+            "turn": self.turn,
+            "role": role,
+            "text": text,
+            "t": round(self.clock() - self.started_at, 3),
+            "at": datetime.now().isoformat(timespec="milliseconds"),
+        })
+
+    def finalize(self, **extra):
+        record = {
+            "callId": self.call_id,
+            "savedAt": datetime.now().isoformat(),
+            **extra,
+            "turns": self.turn,
+            "utterances": self.seq,
+        }
+        self.writer.submit(TRANSCRIPT_STREAM, {
+            "callId": self.call_id,
+            "event": "end",
+            "seq": self.seq + 1,
+            "t": round(self.clock() - self.started_at, 3),
+            "at": datetime.now().isoformat(timespec="milliseconds"),
+            "record": record,
+        })
+        return record
+
+
+class TranscriptSink:
+    """
+    Write-behind sink for the transcripts stream: appends each event to its
+    call's JSONL file, keeping files open only while calls are live. On a
+    call's end event it reads the file back and stores the complete dialog
+    in `store` as kind "dialog". Events and end marker share one stream, so
+    the end is never written ahead of the call's last utterances.
+    """
+
+    def __init__(self, store=None, directory=TRANSCRIPT_DIR):
+        self.store = store
+        self.directory = directory
+        self._files = {}
+        self._dirty = set()
+
+    def write(self, records):
+        ended = []
+        for event in records:
+            call_id = event["callId"]
+            f = self._files.get(call_id)
+            if f is None:
+                os.makedirs(self.directory, exist_ok=True)
+                f = self._files[call_id] = open(transcript_path(call_id, self.directory), "a", encoding="utf-8")
+            f.write(json.dumps(event) + "\n")
+            self._dirty.add(call_id)
+            if event.get("event") == "end":
+                ended.append(event)
+        for event in ended:
+            self._files.pop(event["callId"]).close()
+            self._dirty.discard(event["callId"])
+            if self.store is not None:
+                record = dict(event["record"], dialog=_dialog(read_transcript(event["callId"], self.directory)))
+                self.store.insert_many("dialog", [record])
+
+    def sync(self):
+        for call_id in self._dirty:
+            f = self._files[call_id]
+            f.flush()
+            os.fsync(f.fileno())
+        self._dirty.clear()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+        self._dirty.clear()
+
+
+def transcript_path(call_id, directory=TRANSCRIPT_DIR):
+    return os.path.join(directory, f"{call_id}.jsonl")
+
+
+def read_transcript(call_id, directory=TRANSCRIPT_DIR):
+    """The utterances of one call in order (a retried write may repeat a line)."""
+    events = {}
+    with open(transcript_path(call_id, directory), encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a torn last line from a crash
+            if "role" in event:
+                events[event["seq"]] = event
+    return [events[seq] for seq in sorted(events)]
+
+
+def _dialog(events):
+    return [{"role": e["role"], "text": e["text"]} for e in events]
+
+
+def compact(directory=TRANSCRIPT_DIR):
+    """
+    Complete dialog records for calls whose transcript has no end event
+    (the relay died before finalize()), built from their streamed events.
+    """
+    records = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.jsonl"))):
+        with open(path, encoding="utf-8") as f:
+            if any('"event": "end"' in line for line in f):
+                continue
+        call_id = os.path.splitext(os.path.basename(path))[0]
+        events = read_transcript(call_id, directory)
+        if not events:
+            continue
+        records.append({
+            "callId": call_id,
+            "savedAt": events[-1]["at"],
+            "turns": events[-1]["turn"],
+            "utterances": len(events),
+            "dialog": _dialog(events),
+            "recovered": True,
+        })
+    return records
+
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+    import tempfile
+    import tracemalloc
+
+    from call_store import CallStore
+    from write_behind import WriteBehindWriter
+
+    if sys.argv[1:2] == ["compact"]:
+        from call_store import store
+
+        records = compact()
+        added = store.insert_many("dialog", records)
+        print(f"✅ Recovered {added} unfinalized call transcript(s) into {store.path}")
+        sys.exit(0)
+
+    # Memory per call stays flat with call length, a finalized call's full
+    # dialog reaches the store, and a call that never reaches finalize() is
+    # still fully on disk.
+    async def main():
+        root = tempfile.mkdtemp()
+        directory = os.path.join(root, TRANSCRIPT_STREAM)
+        store = CallStore(os.path.join(root, "calls.db"))
+        wb = WriteBehindWriter(root=root, fsync=False)
+        wb.register(TRANSCRIPT_STREAM, TranscriptSink(store, directory))
+        sizes = {}
+        for utterances in (100, 10_000):
+            log = TranscriptLog(f"call{utterances}", writer=wb)
+            await asyncio.sleep(0.1)
+            tracemalloc.start()
+            for i in range(utterances):
+                log.append("user" if i % 2 else "ai", f"utterance number {i} of a long call")
+                if i % 50 == 0:
+                    await asyncio.sleep(0)  # let the writer drain
+            await asyncio.sleep(0.5)  # the writer is idle again
+            sizes[utterances] = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            if utterances == 100:
+                log.finalize(caller="+16175550123")
+        await wb.close()
+        print(f"retained memory: {sizes[100] / 1024:.1f} KiB after 100 utterances, "
+              f"{sizes[10_000] / 1024:.1f} KiB after 10000")
+
+        stored = store.get("call100", "dialog")
+        assert stored is not None and len(stored["dialog"]) == 100, stored
+        assert stored["dialog"][0]["text"] == "utterance number 0 of a long call"
+        print("✅ finalized call stored with its complete dialog")
+        assert len(read_transcript("call10000", directory)) == 10_000
+        recovered = compact(directory)
+        assert [r["callId"] for r in recovered] == ["call10000"], recovered
+        assert len(recovered[0]["dialog"]) == 10_000
+        print("✅ unfinalized call recovered in full from its transcript file")
+
+    asyncio.run(main())
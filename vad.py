@@ -0,0 +1,384 @@
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+from audio_codec import MULAW_TO_PCM
+from metrics import barge_in_latency
+from sts_pool import KEEPALIVE_MESSAGE
+
+# ------------------------------------------------------------------
+# Local voice-activity detection on the inbound mulaw stream
+# ------------------------------------------------------------------
+# LOCAL_VAD=1 lets the relay clear agent playback as soon as the caller
+# starts talking instead of waiting for Deepgram's UserStartedSpeaking.
+LOCAL_VAD = os.getenv("LOCAL_VAD", "0") == "1"
+VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB", "-40"))  # absolute floor, dBFS
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "12"))  # above the tracked noise floor
+VAD_MAX_ZCR = float(os.getenv("VAD_MAX_ZCR", "0.35"))  # crossings per sample; hiss is higher
+VAD_START_MS = int(os.getenv("VAD_START_MS", "60"))
+VAD_HANGOVER_MS = int(os.getenv("VAD_HANGOVER_MS", "300"))
+# After a local clear, agent audio is dropped until Deepgram's
+# UserStartedSpeaking confirms the barge-in, or for at most this long.
+BARGE_IN_MUTE_MS = int(os.getenv("BARGE_IN_MUTE_MS", "1500"))
+
+# SILENCE_SUPPRESSION=1 stops streaming caller silence to Deepgram once it
+# has lasted SILENCE_SUPPRESS_AFTER_MS (kept longer than the agent's
+# endpointing window so end-of-turn detection still sees real silence) and
+# sends a KeepAlive every SILENCE_KEEPALIVE_MS instead.
+SILENCE_SUPPRESSION = os.getenv("SILENCE_SUPPRESSION", "0") == "1"
+SILENCE_SUPPRESS_AFTER_MS = int(os.getenv("SILENCE_SUPPRESS_AFTER_MS", "2000"))
+SILENCE_PREROLL_MS = int(os.getenv("SILENCE_PREROLL_MS", "300"))
+SILENCE_KEEPALIVE_MS = int(os.getenv("SILENCE_KEEPALIVE_MS", "5000"))
+
+SAMPLES_PER_MS = 8
+
+
+class VoiceActivityDetector:
+    """
+    Energy / zero-crossing VAD over 20 ms mulaw frames with hysteresis.
+
+    A frame is voiced when its energy is above both the absolute threshold
+    and the tracked noise floor plus a margin, and its zero-crossing rate is
+    below `max_zcr`. Speech starts after `start_ms` of consecutive voiced
+    frames and ends after `hangover_ms` of unvoiced ones. A whole payload is
+    decoded and measured in one numpy pass; the per-frame loop only runs the
+    state machine.
+    """
+
+    def __init__(self, frame_ms=20, threshold_db=VAD_THRESHOLD_DB, margin_db=VAD_MARGIN_DB,
+                 max_zcr=VAD_MAX_ZCR, start_ms=VAD_START_MS, hangover_ms=VAD_HANGOVER_MS):
+        self.frame_size = frame_ms * SAMPLES_PER_MS
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.max_zcr = max_zcr
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.noise_db = threshold_db - margin_db
+
+        self.speaking = False
+        self._run = 0  # consecutive frames disagreeing with the current state
+        self._pending = b""
+
+        self.frames = 0
+        self.onsets = 0
+
+    def process(self, mulaw):
+        """
+        Feed raw mulaw bytes; returns how many frames ago speech started
+        (0 = this payload's last frame) if an onset happened, else None.
+        """
+        data = self._pending + bytes(mulaw) if self._pending else mulaw
+        usable = len(data) - len(data) % self.frame_size
+        self._pending = bytes(data[usable:])
+        if not usable:
+            return None
+
+        samples = MULAW_TO_PCM[np.frombuffer(data, dtype=np.uint8, count=usable)]
+        frames = samples.reshape(-1, self.frame_size).astype(np.float32)
+        energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) / 32768.0 ** 2 + 1e-10)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / self.frame_size
+
+        onset = None
+        count = len(energy_db)
+        for i in range(count):
+            level = energy_db[i]
+            voiced = level > self.threshold_db and level > self.noise_db + self.margin_db and zcr[i] < self.max_zcr
+            if not voiced:
+                # Follow the floor down quickly and up slowly.
+                rate = 0.2 if level < self.noise_db else 0.02
+                self.noise_db += rate * (level - self.noise_db)
+
+            if voiced == self.speaking:
+                self._run = 0
+                continue
+            self._run += 1
+            if self.speaking and self._run >= self.hangover_frames:
+                self.speaking = False
+                self._run = 0
+            elif not self.speaking and self._run >= self.start_frames:
+                self.speaking = True
+                self._run = 0
+                self.onsets += 1
+                onset = count - 1 - i + self.start_frames - 1
+        self.frames += count
+        return onset
+
+
+class BargeInMonitor:
+    """
+    Runs the VAD on inbound audio for one call and measures barge-in
+    latency: the time from the first voiced frame of an utterance to the
+    local detection ("local") and to Deepgram's UserStartedSpeaking
+    ("upstream"), recorded in metrics.barge_in_latency.
+
+    Deepgram keeps streaming the interrupted response until it sees the
+    barge-in itself, so after local_clear() agent audio is muted (muting()
+    is True) until on_upstream() or `mute_ms` passes. A mute that times
+    out without UserStartedSpeaking counts as a false positive.
+    """
+
+    def __init__(self, vad=None, frame_ms=20, mute_ms=BARGE_IN_MUTE_MS, clock=time.monotonic):
+        self.vad = vad or VoiceActivityDetector(frame_ms)
+        self.frame_seconds = frame_ms / 1000
+        self.mute_seconds = mute_ms / 1000
+        self.clock = clock
+        self.speech_started_at = None
+        self._muted_at = None
+        self.local_clears = 0
+        self.false_positives = 0
+        self.muted_bytes = 0
+
+    def local_clear(self):
+        """The relay cut agent playback on a local onset."""
+        self.local_clears += 1
+        self._muted_at = self.clock()
+
+    def muting(self, audio):
+        """True while agent audio should be dropped; counts what is."""
+        if self._muted_at is None or self._expired(self.clock()):
+            return False
+        self.muted_bytes += len(audio)
+        return True
+
+    def stats(self):
+        return {
+            "local_clears": self.local_clears,
+            "false_positives": self.false_positives,
+            "muted_bytes": self.muted_bytes,
+        }
+
+    def _expired(self, now):
+        if self._muted_at is not None and now - self._muted_at >= self.mute_seconds:
+            self._muted_at = None
+            self.false_positives += 1
+            return True
+        return False
+
+    def on_audio(self, mulaw):
+        """True when the caller has just started speaking."""
+        self._expired(self.clock())
+        frames_ago = self.vad.process(mulaw)
+        if frames_ago is None:
+            return False
+        now = self.clock()
+        # The onset frame arrived `frames_ago` frames before this payload ended.
+        self.speech_started_at = now - frames_ago * self.frame_seconds
+        barge_in_latency["local"].observe(now - self.speech_started_at)
+        return True
+
+    def on_upstream(self):
+        """Deepgram reported UserStartedSpeaking."""
+        self._muted_at = None  # barge-in confirmed; the next response is new
+        if self.speech_started_at is not None:
+            barge_in_latency["upstream"].observe(self.clock() - self.speech_started_at)
+            self.speech_started_at = None
+
+
+class SilenceGate:
+    """
+    Drops sustained caller silence from the upstream audio.
+
+    filter() takes each inbound frame (any multiple of 20 ms) and returns
+    what to send instead: the frame itself while the caller is talking or
+    for `suppress_after_ms` after they stop, nothing while the line stays
+    quiet beyond that, and a KeepAlive every `keepalive_ms` of suppressed
+    audio. The last `preroll_ms` of suppressed audio is kept (copied, since
+    inbound frames are views into the framer's ring) and sent ahead of the
+    frame where speech resumes, so word onsets are never clipped.
+
+    With `feed_vad=False` the gate only reads `vad.speaking`: the detector
+    is shared with a BargeInMonitor that already feeds it the same audio,
+    so each inbound frame is analysed once.
+    """
+
+    def __init__(self, vad=None, suppress_after_ms=SILENCE_SUPPRESS_AFTER_MS,
+                 preroll_ms=SILENCE_PREROLL_MS, keepalive_ms=SILENCE_KEEPALIVE_MS, feed_vad=True):
+        self.vad = vad or VoiceActivityDetector()
+        self.feed_vad = feed_vad
+        self.suppress_after = suppress_after_ms * SAMPLES_PER_MS
+        self.preroll_bytes = preroll_ms * SAMPLES_PER_MS
+        self.keepalive_bytes = keepalive_ms * SAMPLES_PER_MS
+        self._quiet = 0  # bytes of audio since the caller last spoke
+        self._since_keepalive = 0
+        self._preroll = deque()
+        self._preroll_len = 0
+
+        self.bytes_in = 0
+        self.bytes_saved = 0
+        self.keepalives = 0
+
+    @property
+    def suppressing(self):
+        return self._quiet >= self.suppress_after
+
+    def filter(self, frame):
+        n = len(frame)
+        self.bytes_in += n
+        if self.feed_vad:
+            self.vad.process(frame)
+
+        if self.vad.speaking:
+            self._quiet = 0
+            self._since_keepalive = 0
+            out = list(self._preroll)
+            self._preroll.clear()
+            self._preroll_len = 0
+            self.bytes_saved -= sum(len(f) for f in out)
+            out.append(frame)
+            return out
+
+        self._quiet += n
+        if not self.suppressing:
+            return [frame]
+
+        self._preroll.append(bytes(frame))
+        self._preroll_len += n
+        while self._preroll_len - len(self._preroll[0]) >= self.preroll_bytes:
+            self._preroll_len -= len(self._preroll.popleft())
+        self.bytes_saved += n
+        self._since_keepalive += n
+        if self._since_keepalive >= self.keepalive_bytes:
+            self._since_keepalive = 0
+            self.keepalives += 1
+            return [KEEPALIVE_MESSAGE]
+        return []
+
+    def stats(self):
+        return {
+            "bytes_in": self.bytes_in,
+            "bytes_saved": self.bytes_saved,
+            "saved_pct": round(100 * self.bytes_saved / self.bytes_in, 1) if self.bytes_in else 0.0,
+            "keepalives": self.keepalives,
+        }
+
+
+if __name__ == "__main__":
+    # Benchmark and sanity check on synthetic audio: line noise, then a
+    # voiced tone burst. `python vad.py FILE...` instead runs the silence
+    # gate check on recorded calls (call_recorder WAVs, call_capture .cap).
+    import struct
+    import sys
+    import timeit
+
+    from audio_codec import pcm16_to_mulaw
+
+    def caller_audio(path):
+        """The caller's mulaw track of a recorded call."""
+        if path.endswith(".cap"):
+            from call_capture import TWILIO_IN_AUDIO, read_capture
+
+            return b"".join(payload for _, kind, payload in read_capture(path) if kind == TWILIO_IN_AUDIO)
+        with open(path, "rb") as f:
+            data = f.read()
+        pos = 12
+        while pos + 8 <= len(data):  # RIFF chunks; the wave module cannot read mulaw
+            chunk, size = struct.unpack_from("<4sI", data, pos)
+            body = data[pos + 8:pos + 8 + size]
+            if chunk == b"fmt ":
+                tag, channels = struct.unpack_from("<HH", body)
+            elif chunk == b"data":
+                break
+            pos += 8 + size + (size & 1)
+        if tag == 7:
+            return np.frombuffer(body, dtype=np.uint8).reshape(-1, channels)[:, 0].tobytes()
+        return pcm16_to_mulaw(np.frombuffer(body, dtype="<i2").reshape(-1, channels)[:, 0].copy())
+
+    def check_gate(call):
+        """Every stretch of speech, from its onset, reaches Deepgram intact."""
+        gate = SilenceGate()
+        sent = []
+        for i in range(0, len(call), 800):  # 100 ms inbound frames
+            sent.extend(gate.filter(memoryview(call)[i:i + 800]))
+        forwarded = b"".join(bytes(item) for item in sent if not isinstance(item, str))
+
+        reference = VoiceActivityDetector()
+        onset_bytes = reference.start_frames * reference.frame_size
+        segments, start = [], None
+        for i in range(0, len(call) - reference.frame_size + 1, reference.frame_size):
+            reference.process(call[i:i + reference.frame_size])
+            if reference.speaking and start is None:
+                start = max(0, i + reference.frame_size - onset_bytes)
+            elif not reference.speaking and start is not None:
+                segments.append((start, i))
+                start = None
+        if start is not None:
+            segments.append((start, len(call) - len(call) % reference.frame_size))
+        missing = [(a / 8000, b / 8000) for a, b in segments if call[a:b] not in forwarded]
+        return segments, missing, gate.stats()
+
+    if sys.argv[1:]:
+        failed = 0
+        for path in sys.argv[1:]:
+            call = caller_audio(path)
+            segments, missing, stats = check_gate(call)
+            failed += bool(missing)
+            print(f"{'❌' if missing else '✅'} {path}: {len(call) / 8000:.1f} s, {len(segments)} speech "
+                  f"segment(s), {len(missing)} not forwarded intact {missing[:3]}; gate {stats}")
+        sys.exit(1 if failed else 0)
+
+    rate = 8000
+    rng = np.random.default_rng(1)
+    t = np.arange(rate * 3) / rate
+    pcm = rng.normal(0, 60, t.size)  # about -55 dBFS line noise
+    speech = slice(rate, rate * 2)
+    pcm[speech] += 6000 * np.sin(2 * np.pi * 220 * t[speech]) * (1 + 0.5 * np.sin(2 * np.pi * 3 * t[speech]))
+
+    mulaw = pcm16_to_mulaw(np.clip(pcm, -32768, 32767).astype(np.int16))
+
+    vad = VoiceActivityDetector()
+    onsets = []
+    for i in range(0, len(mulaw), 160):
+        frames_ago = vad.process(mulaw[i:i + 160])
+        if frames_ago is not None:
+            onsets.append((i // 160 - frames_ago) * 20)
+    assert onsets and abs(onsets[0] - 1000) <= 40, onsets
+    print(f"✅ onset detected at {onsets[0]} ms (speech starts at 1000 ms), {vad.onsets} onset(s)")
+
+    payload = mulaw[:160]
+    detector = VoiceActivityDetector()
+    per_frame = timeit.timeit(lambda: detector.process(payload), number=20_000) / 20_000 * 1e6
+    batch = mulaw[:1600]
+    per_batch = timeit.timeit(lambda: detector.process(batch), number=5_000) / 5_000 * 1e6
+    print(f"process(): {per_frame:.1f} µs per 20 ms payload, {per_batch / 10:.1f} µs per frame in 200 ms batches")
+
+    # Silence gate on a call with pauses of different lengths: every speech
+    # segment (with its onset) must reach Deepgram byte for byte and in
+    # order, so what the agent transcribes cannot change.
+    segments = [(1.0, 2.5), (3.0, 4.0), (9.0, 11.0), (30.0, 31.5), (31.8, 33.0)]
+    t = np.arange(rate * 40) / rate
+    pcm = rng.normal(0, 60, t.size)
+    for start, end in segments:
+        span = slice(int(start * rate), int(end * rate))
+        pcm[span] += 6000 * np.sin(2 * np.pi * 180 * t[span]) * (1 + 0.5 * np.sin(2 * np.pi * 4 * t[span]))
+    call = pcm16_to_mulaw(np.clip(pcm, -32768, 32767).astype(np.int16))
+
+    found, missing, stats = check_gate(call)
+    assert len(found) == len(segments) and not missing, (found, missing)
+    print(f"✅ all {len(segments)} speech segments forwarded intact; gate {stats}")
+
+    # Sharing the barge-in monitor's detector gives the gate the same view
+    # of the call while the VAD runs once per frame.
+    shared = BargeInMonitor()
+    gate = SilenceGate(shared.vad, feed_vad=False)
+    for i in range(0, len(call), 800):
+        shared.on_audio(call[i:i + 800])
+        gate.filter(memoryview(call)[i:i + 800])
+    assert gate.stats() == stats and shared.vad.frames == len(call) // 160, (gate.stats(), stats)
+    print(f"✅ shared VAD: {shared.vad.frames} frames analysed once, same gate result")
+
+    # After a local clear, agent audio stays muted until UserStartedSpeaking;
+    # a mute that times out instead is a false positive.
+    now = [0.0]
+    monitor = BargeInMonitor(mute_ms=1500, clock=lambda: now[0])
+    monitor.local_clear()
+    now[0] = 0.5
+    assert monitor.muting(b"x" * 800)
+    monitor.on_upstream()
+    assert not monitor.muting(b"x" * 800)
+    monitor.local_clear()
+    now[0] = 2.5
+    assert not monitor.muting(b"x" * 800) and monitor.false_positives == 1, monitor.stats()
+    print(f"✅ barge-in mute {monitor.stats()}")
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from datetime import datetime
+
+from metrics import Histogram
+from relay_log import log
+
+# ------------------------------------------------------------------
+# Async write-behind persistence
+# ------------------------------------------------------------------
+DATA_DIR = os.getenv("DATA_DIR", "data")
+SEGMENT_BYTES = 64 * 1024 * 1024
+WRITE_RETRIES = 3  # failed records are retried this often before being dropped
+
+
+class JsonlSegmentSink:
+    """Appends records to rotating, append-only JSONL segment files in `directory`."""
+
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self._file = None
+        self._seq = 0
+
+    def write(self, records):
+        if self._file is None or self._file.tell() >= self.segment_bytes:
+            self._rotate()
+        self._file.write("".join(json.dumps(record) + "\n" for record in records))
+
+    def sync(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _rotate(self):
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self._seq += 1
+        # pid keeps segments apart when several supervisor workers share a disk.
+        name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}-{os.getpid()}-{self._seq:04d}.jsonl"
+        self._file = open(os.path.join(self.directory, name), "a", encoding="utf-8")
+
+
+class WriteBehindWriter:
+    """
+    Takes records from the event loop without touching the disk.
+
+    submit() only appends to an in-memory queue. A background task drains it
+    in batches; serialization, writes and one grouped fsync per batch run in
+    a worker thread. close() drains whatever is still queued. Streams are
+    written by their registered sink, by default a JsonlSegmentSink under
+    DATA_DIR/<stream>. Records of a stream whose write fails go back to the
+    front of the queue and are retried with backoff; after WRITE_RETRIES
+    they are written one by one and only those that still fail are dropped,
+    each one logged.
+    """
+
+    def __init__(self, root=DATA_DIR, batch_size=512, flush_interval=0.05, fsync=True,
+                 report_interval=60.0):
+        self.root = root
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.report_interval = report_interval
+        self.sinks = {}
+        self._queue = deque()  # (stream, record, submitted_at)
+        self._wakeup = None
+        self._closing = False
+        self._task = None
+        self._failures = 0  # consecutive failed flushes
+
+        self.write_latency = Histogram()
+        self.high_water = 0
+        self.records_written = 0
+        self.batches = 0
+        self.errors = 0
+        self.dropped = 0
+
+    def register(self, stream, sink):
+        """Route `stream` to a sink with write(records), sync() and close()."""
+        self.sinks[stream] = sink
+
+    def submit(self, stream, record):
+        """Queue one record; never blocks the event loop."""
+        self._queue.append((stream, record, time.monotonic()))
+        self.high_water = max(self.high_water, len(self._queue))
+        if self._task is None:
+            self._start()
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    async def close(self):
+        """Drain the queue and close every sink."""
+        if self._task is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await asyncio.to_thread(self._close_sinks)
+
+    def stats(self):
+        return {
+            "queue_depth": len(self._queue),
+            "high_water": self.high_water,
+            "records_written": self.records_written,
+            "batches": self.batches,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "write_latency": self.write_latency.summary(),
+        }
+
+    # --- internals ---
+    def _start(self):
+        asyncio.get_running_loop()  # submit() must be called from the loop
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        last_report = time.monotonic()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._queue:
+                await self._flush()
+            if self._closing:
+                return
+            if time.monotonic() - last_report >= self.report_interval:
+                log.info("📊 Write-behind: %s", self.stats())
+                last_report = time.monotonic()
+
+    async def _flush(self):
+        batch = []
+        while self._queue and len(batch) < self.batch_size:
+            batch.append(self._queue.popleft())
+        written, failed = await asyncio.to_thread(self._write_batch, batch)
+        self._observe(written)
+        self.batches += 1
+        if not failed:
+            self._failures = 0
+            return
+
+        self.errors += 1
+        self._failures += 1
+        if self._failures <= WRITE_RETRIES:
+            self._queue.extendleft(reversed(failed))
+            await asyncio.sleep(min(0.1 * 2 ** self._failures, 5.0))
+            return
+        # Still failing: isolate the records that cannot be written.
+        self._failures = 0
+        for item in failed:
+            written, still_failed = await asyncio.to_thread(self._write_batch, [item])
+            self._observe(written)
+            for stream, record, _ in still_failed:
+                self.dropped += 1
+                log.error("❌ Write-behind dropped %s record after %d retries: %.500r", stream, WRITE_RETRIES, record)
+
+    def _observe(self, written):
+        now = time.monotonic()
+        for _, _, submitted_at in written:
+            self.write_latency.observe(now - submitted_at)
+        self.records_written += len(written)
+
+    def _write_batch(self, batch):
+        """Write a batch per stream; returns (written, failed) queue items."""
+        grouped = {}
+        for item in batch:
+            grouped.setdefault(item[0], []).append(item)
+        written, failed = [], []
+        for stream, items in grouped.items():
+            try:
+                sink = self.sinks.get(stream)
+                if sink is None:
+                    sink = self.sinks[stream] = JsonlSegmentSink(os.path.join(self.root, stream))
+                sink.write([record for _, record, _ in items])
+                if self.fsync:
+                    sink.sync()
+            except Exception as e:
+                log.error("❌ Write-behind %s: %d record(s) failed: %s", stream, len(items), e)
+                failed.extend(items)
+            else:
+                written.extend(items)
+        return written, failed
+
+    def _close_sinks(self):
+        for sink in self.sinks.values():
+            sink.close()
+
+
+# Process-wide writer used by agent_functions and the relay
+writer = WriteBehindWriter()
+
+
+if __name__ == "__main__":
+    # Benchmark: event-loop stall while persisting records, sync vs write-behind.
+    import tempfile
+
+    from loadtest import loop_stalls
+
+    RECORDS = 2000
+    record = {
+        "patientType": "new", "fullName": "John Doe", "email": "john@example.com",
+        "phoneNumber": "6175550123", "message": "teeth cleaning", "source": ["voice-agent"],
+    }
+
+    async def measure(persist):
+        stalls = await loop_stalls(persist)
+        return max(stalls) * 1000, sum(s for s in stalls if s > 0.005) * 1000
+
+    async def main():
+        root = tempfile.mkdtemp()
+
+        async def sync_path():
+            for i in range(RECORDS):
+                with open(os.path.join(root, f"{i}.json"), "w") as f:
+                    json.dump(record, f, indent=2)
+                if i % 20 == 0:
+                    await asyncio.sleep(0)  # other calls' turns
+
+        wb = WriteBehindWriter(root=root)
+
+        async def write_behind_path():
+            for i in range(RECORDS):
+                wb.submit("calls", record)
+                if i % 20 == 0:
+                    await asyncio.sleep(0)
+            await wb.close()
+
+        for name, fn in (("sync open+dump", sync_path), ("write-behind", write_behind_path)):
+            worst, stalled = await measure(fn)
+            print(f"{name:15s} worst loop stall {worst:7.2f} ms, time stalled >5ms {stalled:8.1f} ms")
+        print(f"write-behind: {wb.stats()}")
+
+    asyncio.run(main())